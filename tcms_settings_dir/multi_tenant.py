@@ -1,4 +1,4 @@
-# Copyright (c) 2020-2025 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2020-2026 Alexander Todorov <atodorov@otb.bg>
 # Copyright (c) 2022 Ivajlo Karabojkov <karabojkov@kitbg.com>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
@@ -35,13 +35,16 @@ for app_list in (INSTALLED_APPS, TENANT_APPS):  # noqa: F821
 KIWI_TENANTS_DOMAIN = os.environ.get("KIWI_TENANTS_DOMAIN")
 
 
-# TenantMainMiddleware always needs to be first
-if (
-    "django_tenants.middleware.main.TenantMainMiddleware"
-    not in MIDDLEWARE  # noqa: F821
-):
+# CachedTenantMainMiddleware replaces TenantMainMiddleware
+if "django_tenants.middleware.main.TenantMainMiddleware" in MIDDLEWARE:  # noqa: F821
+    MIDDLEWARE.remove(  # noqa: F821
+        "django_tenants.middleware.main.TenantMainMiddleware"
+    )
+
+# and always needs to be first
+if "tcms_tenants.middleware.CachedTenantMainMiddleware" not in MIDDLEWARE:  # noqa: F821
     MIDDLEWARE.insert(  # noqa: F821
-        0, "django_tenants.middleware.main.TenantMainMiddleware"
+        0, "tcms_tenants.middleware.CachedTenantMainMiddleware"
     )
 
 if (
@@ -52,6 +55,9 @@ if (
         "tcms_tenants.middleware.BlockUnauthorizedUserMiddleware"
     )
 
+if "tcms_tenants.middleware.StorageQuotaMiddleware" not in MIDDLEWARE:  # noqa: F821
+    MIDDLEWARE.append("tcms_tenants.middleware.StorageQuotaMiddleware")  # noqa: F821
+
 # replace ModelBackend with GroupsBackend
 if "django.contrib.auth.backends.ModelBackend" in AUTHENTICATION_BACKENDS:  # noqa: F821
     idx = AUTHENTICATION_BACKENDS.index(  # noqa: F821
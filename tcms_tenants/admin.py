@@ -1,19 +1,137 @@
-# Copyright (c) 2019-2024 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2019-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
 
+import csv
+import datetime
+
 from django import forms
-from django.urls import reverse
+from django.conf import settings
+from django.urls import path, reverse
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, SEARCH_VAR, ChangeList
+from django.contrib.postgres.search import TrigramSimilarity
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db.models import Count, Prefetch, Q
+from django.db.models.functions import Greatest
 from django.forms.utils import ErrorList
+from django.template.defaultfilters import filesizeformat
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
-from django.http import HttpResponseForbidden, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseRedirect
+from django.template.response import TemplateResponse
 
 from tcms.core.forms.fields import UserField
 
-from tcms_tenants.models import Tenant
-from tcms_tenants.utils import add_to_default_groups, owns_tenant, tenant_url
+from tcms_tenants.forms import ImportAuthorizedUsersForm
+from tcms_tenants.models import Domain, Tenant
+from tcms_tenants.utils import (
+    add_to_default_groups,
+    estimated_count,
+    import_authorized_users,
+    iter_email_addresses,
+    request_owns_tenant,
+    tenant_domain,
+    tenant_domains,
+    tenant_url,
+)
+from tenant_groups.models import Group as TenantGroup
+
+CURSOR_VAR = "cursor"
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the planner statistics instead of COUNT(*) for unfiltered
+    querysets over large tables!
+    """
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            threshold = getattr(
+                settings, "KIWI_TENANTS_ADMIN_ESTIMATED_COUNT_THRESHOLD", 10000
+            )
+            estimate = estimated_count(self.object_list.model)
+            if estimate > threshold:
+                return estimate
+
+        return self.object_list.count()
+
+
+class TenantChangeList(ChangeList):
+    """
+    Pages through tenants in the default (created_on, pk) order by seeking
+    after the last row of the previous page instead of using OFFSET. Search
+    results are ranked by similarity. Searching or sorting by another column
+    falls back to regular pagination!
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.keyset = ORDER_VAR not in request.GET and not request.GET.get(SEARCH_VAR)
+        self.cursor = self.parse_cursor(request.GET.get(CURSOR_VAR))
+        super().__init__(request, *args, **kwargs)
+
+    @staticmethod
+    def parse_cursor(value):
+        if not value:
+            return None
+
+        created_on, _separator, pk = value.rpartition("|")
+        try:
+            return datetime.datetime.fromisoformat(created_on), int(pk)
+        except ValueError as err:
+            raise IncorrectLookupParameters(err) from err
+
+    def get_queryset(self, request, exclude_parameters=None):
+        # not a lookup, also don't carry it over to links & the search form
+        self.params.pop(CURSOR_VAR, None)
+        self.filter_params.pop(CURSOR_VAR, None)
+
+        return super().get_queryset(request, exclude_parameters)
+
+    def get_ordering(self, request, queryset):
+        ordering = super().get_ordering(request, queryset)
+
+        # best matches first unless sorting by a column
+        if self.query and ORDER_VAR not in self.params:
+            ordering.insert(0, "-search_rank")
+
+        return ordering
+
+    def get_results(self, request):
+        super().get_results(request)
+
+        if not self.keyset or (self.show_all and self.can_show_all):
+            return
+
+        queryset = self.queryset
+        if self.cursor:
+            created_on, pk = self.cursor
+            queryset = queryset.filter(
+                Q(created_on__lt=created_on) | Q(created_on=created_on, pk__lt=pk)
+            )
+        self.result_list = queryset[: self.list_per_page]
+
+    @property
+    def next_page_url(self):
+        if not self.keyset or len(self.result_list) < self.list_per_page:
+            return None
+
+        last = self.result_list[len(self.result_list) - 1]
+        return self.get_query_string(
+            {CURSOR_VAR: f"{last.created_on.isoformat()}|{last.pk}"}
+        )
+
+    @property
+    def first_page_url(self):
+        if not self.cursor:
+            return None
+
+        return self.get_query_string()
 
 
 class TenantAdmin(admin.ModelAdmin):
@@ -33,9 +151,14 @@ class TenantAdmin(admin.ModelAdmin):
         "owner",
         "extra_emails",
         "organization",
+        "authorized_users_count",
+        "storage_usage",
     )
     search_fields = ("name", "schema_name", "organization")
-    ordering = ["-created_on"]
+    ordering = ["-created_on", "-pk"]
+    paginator = EstimatedCountPaginator
+    # avoid a second COUNT(*) over the entire table when searching
+    show_full_result_count = False
 
     def add_view(self, request, form_url="", extra_context=None):
         return HttpResponseRedirect(reverse("tcms_tenants:create-tenant"))
@@ -54,6 +177,60 @@ class TenantAdmin(admin.ModelAdmin):
 
         return HttpResponseForbidden(_("Unauthorized"))
 
+    def get_queryset(self, request):
+        """
+        Everything displayed in the changelist is fetched together with the
+        page instead of once per row!
+        """
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("owner", "storage_usage")
+            .prefetch_related(
+                Prefetch(
+                    "domains",
+                    queryset=Domain.objects.filter(is_primary=True).order_by("pk"),
+                    to_attr="primary_domains",
+                )
+            )
+            .annotate(authorized_users_count=Count("authorized_users", distinct=True))
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term
+        )
+
+        if search_term:
+            queryset = queryset.annotate(
+                search_rank=Greatest(
+                    *[
+                        TrigramSimilarity(field, search_term)
+                        for field in self.search_fields
+                    ]
+                )
+            )
+
+        return queryset, may_have_duplicates
+
+    def get_changelist(self, request, **kwargs):
+        return TenantChangeList
+
+    def get_changelist_instance(self, request):
+        changelist = super().get_changelist_instance(request)
+
+        # tenants w/o a primary domain fall back to the default one,
+        # resolve all of them with a single query
+        tenant_domains(
+            [
+                tenant.schema_name
+                for tenant in changelist.result_list
+                if not tenant.primary_domains
+            ]
+        )
+
+        return changelist
+
     @admin.options.csrf_protect_m
     def delete_view(self, request, object_id, extra_context=None):
         if request.user.is_superuser:
@@ -62,7 +239,26 @@ class TenantAdmin(admin.ModelAdmin):
         return HttpResponseForbidden(_("Unauthorized"))
 
     def domain_name(self, instance):  # pylint: disable=no-self-use
-        return instance.domains.filter(is_primary=True).first().domain
+        primary_domains = getattr(instance, "primary_domains", None)
+        if primary_domains:
+            return primary_domains[0].domain
+
+        return tenant_domain(instance.schema_name)
+
+    @admin.display(description=_("Authorized users"), ordering="authorized_users_count")
+    def authorized_users_count(self, instance):  # pylint: disable=no-self-use
+        return instance.authorized_users_count
+
+    @admin.display(description=_("Storage usage"), ordering="storage_usage__bytes")
+    def storage_usage(self, instance):  # pylint: disable=no-self-use
+        usage = getattr(instance, "storage_usage", None)
+        if not usage:
+            return "-"
+
+        result = f"{filesizeformat(usage.bytes)} / {usage.files}"
+        if usage.effective_quota is not None:
+            result += f" ({filesizeformat(usage.effective_quota)} quota)"
+        return result
 
 
 class AuthorizedUsersChangeForm(forms.ModelForm):
@@ -143,6 +339,7 @@ class AuthorizedUsersAdmin(admin.ModelAdmin):
         "user_full_name",
         "groups",
     )
+    list_select_related = ("user",)
     search_fields = ("user__username",)
 
     form = AuthorizedUsersChangeForm
@@ -159,10 +356,79 @@ class AuthorizedUsersAdmin(admin.ModelAdmin):
     user_full_name.short_description = _("Full name")
 
     def groups(self, instance):  # pylint: disable=no-self-use
-        return list(instance.user.tenant_groups.values_list("name", flat=True))
+        group_names = getattr(instance, "group_names", None)
+        if group_names is None:
+            group_names = list(
+                instance.user.tenant_groups.values_list("name", flat=True)
+            )
+        return group_names
 
     groups.short_description = _("Groups")
 
+    def get_urls(self):
+        return [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name=f"{self.opts.app_label}_{self.opts.model_name}_import",
+            ),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """
+        Authorize all users from an uploaded file, responds with a CSV report!
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        form = ImportAuthorizedUsersForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            report = import_authorized_users(
+                request,
+                iter_email_addresses(form.cleaned_data["file"]),
+                form.cleaned_data["notify_via_email"],
+            )
+
+            response = HttpResponse(content_type="text/csv")
+            response["Content-Disposition"] = (
+                f'attachment; filename="{request.tenant.schema_name}-import.csv"'
+            )
+            writer = csv.writer(response)
+            writer.writerow(["email", "status", "reason"])
+            writer.writerows(report)
+            return response
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.opts,
+            "form": form,
+            "title": _("Import authorized users"),
+        }
+        return TemplateResponse(
+            request,
+            f"admin/{self.opts.app_label}/{self.opts.model_name}/import.html",
+            context,
+        )
+
+    def get_changelist_instance(self, request):
+        changelist = super().get_changelist_instance(request)
+
+        # group membership for the entire page with a single query
+        group_names = {}
+        for user_id, name in (
+            TenantGroup.user_set.through.objects.filter(
+                user_id__in=[row.user_id for row in changelist.result_list]
+            )
+            .order_by("group__name")
+            .values_list("user_id", "group__name")
+        ):
+            group_names.setdefault(user_id, []).append(name)
+
+        for row in changelist.result_list:
+            row.group_names = group_names.get(row.user_id, [])
+
+        return changelist
+
     def get_queryset(self, request):
         """
         Show only users authorized for the current tenant!
@@ -193,25 +459,25 @@ class AuthorizedUsersAdmin(admin.ModelAdmin):
         """
         Allow to add new authorized users.
         """
-        return owns_tenant(request.user, request.tenant)
+        return request_owns_tenant(request)
 
     def has_change_permission(self, request, obj=None):
         """
         Allow to display the list of of authorized users.
         """
-        return owns_tenant(request.user, request.tenant)
+        return request_owns_tenant(request)
 
     def has_delete_permission(self, request, obj=None):
         """
         Allow to delete selected users.
         """
-        return request.user.is_superuser or owns_tenant(request.user, request.tenant)
+        return request.user.is_superuser or request_owns_tenant(request)
 
     def has_module_permission(self, request):
         """
         Allow this module to be seen in main admin page.
         """
-        return owns_tenant(request.user, request.tenant)
+        return request_owns_tenant(request)
 
     def get_model_perms(self, request):
         """
@@ -220,7 +486,7 @@ class AuthorizedUsersAdmin(admin.ModelAdmin):
         if request.user.is_superuser:
             return super().get_model_perms(request)
 
-        return {"view": owns_tenant(request.user, request.tenant)}
+        return {"view": request_owns_tenant(request)}
 
     def delete_model(self, request, obj):
         """
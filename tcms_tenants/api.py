@@ -6,7 +6,6 @@
 # pylint: disable=missing-permission-required, no-self-use
 
 from tcms.rpc.views import rpc_method
-from tcms_tenants.forms import InviteUsersForm
 from tcms_tenants import utils
 
 
@@ -15,7 +14,7 @@ def tenant_owner_required(request):
     Authentication predicate: the user must own the current tenant.
     Returns the user if authorized, None otherwise.
     """
-    if utils.owns_tenant(request.user, request.tenant):
+    if utils.request_owns_tenant(request):
         return request.user
     return None
 
@@ -48,23 +47,59 @@ def invite(
     """
     request = rpc_context.request
 
-    success = []
-    errored = []
+    # blank addresses are skipped silently, the same way InviteUsersForm does
+    valid, errored = utils.validate_email_addresses(
+        email for email in email_addresses if email and str(email).strip()
+    )
+    utils.invite_users(request, valid.values(), notify_via_email)
 
-    # convert input data into expected format
+    return {
+        "success": [email for email in email_addresses if email not in errored],
+        "errored": list(errored.keys()),
+    }
+
+
+@rpc_method(
+    name="Tenant.invite_bulk",
+    auth=tenant_owner_required,
+    context_target="rpc_context",
+)
+def invite_bulk(
+    email_addresses, notify_via_email, rpc_context=None
+):  # pylint: disable=missing-api-permissions-required
+    """
+    .. function:: RPC Tenant.invite_bulk(email_addresses, notify_via_email)
+
+        [Create accounts] and invite them to the current tenant. All
+        addresses are validated and processed in a single batch!
+
+        :param email_addresses: List of email addresses
+        :type email_addresses: list(str)
+        :param notify_via_email: Whether to send notification email or not
+        :type notify_via_email: bool
+        :param rpc_context: Provides access to the current request, protocol,
+                entry point name and handler instance from the rpc method
+        :type rpc_context: modernrpc.core.RpcRequestContext
+        :return: Status for each address in the same order as the input. Status
+                 is one of ``invited``, ``already-authorized``, ``created-account``
+                 or ``invalid`` in which case there is also a ``reason`` field
+        :rtype: list(dict)
+        :raises PermissionDenied: if caller isn't authorized to invite other users
+
+    .. versionadded:: 15.4
+    """
+    request = rpc_context.request
+
+    valid, errored = utils.validate_email_addresses(email_addresses)
+    statuses = utils.invite_users(request, valid.values(), notify_via_email)
+
+    result = []
     for email in email_addresses:
-        form = InviteUsersForm(
-            {
-                "email_0": email,
-            }
-        )
-        if form.is_valid():
-            utils.invite_users(request, form.cleaned_data["emails"], notify_via_email)
-            success.append(email)
+        if email in errored:
+            result.append(
+                {"email": email, "status": "invalid", "reason": errored[email]}
+            )
         else:
-            errored.append(email)
+            result.append({"email": email, "status": statuses[valid[email].lower()]})
 
-    return {
-        "success": success,
-        "errored": errored,
-    }
+    return result
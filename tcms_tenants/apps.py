@@ -1,5 +1,5 @@
 # Copyright (c) 2021 Ivajlo Karabojkov <karabojkov@kitbg.com>
-# Copyright (c) 2025 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2025-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
@@ -13,11 +13,46 @@ class AppConfig(DjangoAppConfig):
     name = "tcms_tenants"
 
     def ready(self):
+        from attachments.models import Attachment
+        from django.db.models.signals import (
+            m2m_changed,
+            post_delete,
+            post_save,
+            pre_delete,
+        )
         from tcms import signals
         from tcms_tenants import checks
 
-        from .handlers import user_deactivated
+        from .handlers import (
+            attachment_saved_or_deleted,
+            authorized_user_saved_or_deleted,
+            authorized_users_changed,
+            tenant_deleted,
+            tenant_or_domain_changed,
+            tenant_saved,
+            user_deactivated,
+        )
+        from .models import Domain, Tenant
 
         register(checks.tenants_env_check)
 
         signals.USER_DEACTIVATED_SIGNAL.connect(user_deactivated)
+
+        m2m_changed.connect(
+            authorized_users_changed, sender=Tenant.authorized_users.through
+        )
+        post_save.connect(
+            authorized_user_saved_or_deleted, sender=Tenant.authorized_users.through
+        )
+        post_delete.connect(
+            authorized_user_saved_or_deleted, sender=Tenant.authorized_users.through
+        )
+        pre_delete.connect(tenant_deleted, sender=Tenant)
+        post_save.connect(tenant_saved, sender=Tenant)
+
+        post_save.connect(attachment_saved_or_deleted, sender=Attachment)
+        post_delete.connect(attachment_saved_or_deleted, sender=Attachment)
+
+        for model in (Tenant, Domain):
+            post_save.connect(tenant_or_domain_changed, sender=model)
+            post_delete.connect(tenant_or_domain_changed, sender=model)
@@ -1,34 +1,61 @@
 # Copyright (c) 2022 Ivajlo Karabojkov <karabojkov@kitbg.com>
-# Copyright (c) 2022-2024 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2022-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
 
 from attachments.models import Attachment
+from django.conf import settings
+from django.core.cache import cache
 from django.template.loader import render_to_string
+from django.utils.functional import SimpleLazyObject
+
+
+def navbar_cache_key(tenant_pk):
+    return f"tcms_tenants.navbar.{tenant_pk}"
+
+
+def _render_tenant_navbar(tenant):
+    key = navbar_cache_key(tenant.pk)
+    customized_logo_contents = cache.get(key)
+
+    if customized_logo_contents is None:
+        if tenant.organization:
+            tenant_name = tenant.organization
+        elif tenant.name:
+            tenant_name = tenant.name
+        else:
+            tenant_name = tenant.schema_name
+
+        tenant_logo = Attachment.objects.attachments_for_object(tenant).first()
+
+        customized_logo_contents = render_to_string(
+            "tcms_tenants/tenant_name.html",
+            {"tenant_name": tenant_name, "tenant_logo": tenant_logo},
+        )
+        cache.set(
+            key,
+            customized_logo_contents,
+            getattr(settings, "KIWI_TENANTS_NAVBAR_CACHE_TTL", 300),
+        )
+
+    return customized_logo_contents
 
 
 def tenant_navbar_processor(request):
     """
-    Provide tenant name for display in navbar
+    Provide tenant name for display in navbar. Rendered only
+    if the template makes use of this variable!
     """
     if not getattr(request, "tenant", None):
         return {"CUSTOMIZED_LOGO_CONTENTS": ""}
 
-    if request.tenant.organization:
-        tenant_name = request.tenant.organization
-    elif request.tenant.name:
-        tenant_name = request.tenant.name
-    else:
-        tenant_name = request.tenant.schema_name
-
-    tenant_logo = Attachment.objects.attachments_for_object(request.tenant).first()
-
-    customized_logo_contents = render_to_string(
-        "tcms_tenants/tenant_name.html",
-        {"tenant_name": tenant_name, "tenant_logo": tenant_logo},
-    )
-    return {"CUSTOMIZED_LOGO_CONTENTS": customized_logo_contents}
+    tenant = request.tenant
+    return {
+        "CUSTOMIZED_LOGO_CONTENTS": SimpleLazyObject(
+            lambda: _render_tenant_navbar(tenant)
+        )
+    }
 
 
 def schema_name_processor(request):
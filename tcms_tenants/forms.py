@@ -1,8 +1,9 @@
-# Copyright (c) 2019-2024 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2019-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
 
+import csv
 import re
 
 from django import forms
@@ -79,6 +80,36 @@ class InviteUsersForm(forms.Form):  # pylint: disable=must-inherit-from-model-fo
         return range(self.number_of_fields)
 
 
+# pylint: disable-next=must-inherit-from-model-form
+class ImportAuthorizedUsersForm(forms.Form):
+    file = forms.FileField(
+        # pylint: disable=form-field-help-text-used
+        help_text=_(
+            "CSV file with an 'email' column or JSON Lines file (.jsonl) "
+            "with one address per line"
+        ),
+    )
+    notify_via_email = forms.BooleanField(required=False, initial=True)
+
+    def clean_file(self):
+        """
+        Parse the entire file, without keeping it in memory, before importing
+        anything so that nothing is applied if it can't be read!
+        """
+        uploaded_file = self.cleaned_data["file"]
+        try:
+            for _email in utils.iter_email_addresses(uploaded_file):
+                pass
+        except (UnicodeDecodeError, csv.Error) as err:
+            raise ValidationError(
+                _("File must be a UTF-8 encoded CSV or JSON Lines file")
+            ) from err
+        finally:
+            uploaded_file.seek(0)
+
+        return uploaded_file
+
+
 class UpdateTenantForm(NewTenantForm):
     enabled_fields = (
         "name",
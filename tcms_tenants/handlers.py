@@ -1,19 +1,33 @@
-# Copyright (c) 2019-2024 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2019-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
 
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
 from django_tenants.utils import (
     get_public_schema_name,
     schema_context,
-    tenant_context,
+)
+
+from tcms_tenants.context_processors import navbar_cache_key
+from tcms_tenants.middleware import tenant_cache
+from tcms_tenants.models import Domain, StorageUsage, Tenant, UserCleanupJob
+from tcms_tenants.utils import (
+    domain_cache,
+    invalidate_authorization,
+    remove_user_from_schemas,
 )
 
 
 def user_deactivated(sender, **kwargs):  # pylint: disable=unused-argument
     """
     Remove a deactivated user account from all authorized tenants
-    and from all tenant groups on each tenant!
+    and from all tenant groups on each tenant! When
+    ``KIWI_TENANTS_DEFER_USER_CLEANUP`` is set tenant groups and permissions
+    are cleaned up later by the ``process_user_cleanup_jobs`` command.
 
     .. warning::
 
@@ -30,14 +44,123 @@ def user_deactivated(sender, **kwargs):  # pylint: disable=unused-argument
     with schema_context(get_public_schema_name()):
         tenant_set = list(user.tenant_set.all())
 
-    for tenant in tenant_set:
-        with tenant_context(tenant):
-            # clear all tenant groups
-            user.tenant_groups.clear()
-
-            # clear permissions assigned on this tenant
-            user.user_permissions.clear()
+    # after the records below are gone, otherwise a parallel request may cache
+    # the old decision again
+    tenant_pks = [tenant.pk for tenant in tenant_set]
+    transaction.on_commit(lambda: invalidate_authorization(tenant_pks, [user.pk]))
+    schema_names = [tenant.schema_name for tenant in tenant_set]
 
-    # remove user from all tenants they've been authorized previously
     with schema_context(get_public_schema_name()):
+        # remove user from all tenants they've been authorized previously
         user.tenant_set.clear()
+
+        if getattr(settings, "KIWI_TENANTS_DEFER_USER_CLEANUP", False):
+            UserCleanupJob.objects.create(user=user, schema_names=schema_names)
+            return
+
+    # clear all tenant groups & permissions assigned on each tenant
+    remove_user_from_schemas(user.pk, schema_names)
+
+
+def authorized_users_changed(
+    sender, instance, action, reverse, pk_set, **kwargs
+):  # pylint: disable=unused-argument
+    """
+    Invalidate cached authorization decisions when users are added to or
+    removed from ``Tenant.authorized_users``, from either side of the relation!
+
+    .. warning::
+
+        This handler is connected to ``m2m_changed`` for
+        ``Tenant.authorized_users.through`` by default!
+    """
+    # on clear pk_set is None so figure out which records will be removed
+    # before that happens but invalidate only after they are gone
+    if action == "pre_clear":
+        if reverse:
+            pks = instance.tenant_set.values_list("pk", flat=True)
+        else:
+            pks = instance.authorized_users.values_list("pk", flat=True)
+        instance.__dict__["_authorized_users_cleared"] = list(pks)
+        return
+
+    if action == "post_clear":
+        pk_set = instance.__dict__.pop("_authorized_users_cleared", [])
+    elif action not in ("post_add", "post_remove"):
+        return
+
+    # otherwise a parallel request may cache the old decision again
+    if reverse:
+        tenant_pks, user_pks = list(pk_set), [instance.pk]
+    else:
+        tenant_pks, user_pks = [instance.pk], list(pk_set)
+    transaction.on_commit(lambda: invalidate_authorization(tenant_pks, user_pks))
+
+
+def authorized_user_saved_or_deleted(
+    sender, instance, **kwargs
+):  # pylint: disable=unused-argument
+    """
+    Invalidate cached authorization decisions when the intermediate model
+    is modified directly, e.g. via ``AuthorizedUsersAdmin``!
+    """
+    if kwargs.get("raw", False):
+        return
+
+    transaction.on_commit(
+        lambda: invalidate_authorization([instance.tenant_id], [instance.user_id])
+    )
+
+
+def tenant_deleted(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Invalidate cached authorization decisions for all users which
+    are authorized for a tenant which is about to be deleted!
+    """
+    tenant_pk = instance.pk
+    user_pks = list(instance.authorized_users.values_list("pk", flat=True))
+    transaction.on_commit(lambda: invalidate_authorization([tenant_pk], user_pks))
+
+
+def tenant_saved(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Invalidate the cached navbar fragment b/c tenant name
+    or organization may have changed! New tenants start tracking
+    storage usage from zero.
+    """
+    cache.delete(navbar_cache_key(instance.pk))
+
+    if kwargs.get("created", False) and not kwargs.get("raw", False):
+        with schema_context(get_public_schema_name()):
+            StorageUsage.objects.get_or_create(tenant=instance)
+
+
+def attachment_saved_or_deleted(
+    sender, instance, **kwargs
+):  # pylint: disable=unused-argument
+    """
+    Invalidate the cached navbar fragment when a tenant logo
+    is uploaded or removed!
+    """
+    if kwargs.get("raw", False):
+        return
+
+    if instance.content_type_id == ContentType.objects.get_for_model(Tenant).pk:
+        cache.delete(navbar_cache_key(instance.object_id))
+
+
+def tenant_or_domain_changed(
+    sender, instance, **kwargs
+):  # pylint: disable=unused-argument
+    """
+    Invalidate cached hostname -> tenant and schema_name -> domain resolution!
+    """
+    if isinstance(instance, Domain):
+        tenant_cache.invalidate(key=instance.domain, tenant_pk=instance.tenant_id)
+    else:
+        tenant_cache.invalidate(tenant_pk=instance.pk)
+    # a new tenant or domain may match a hostname which wasn't known before
+    tenant_cache.clear_not_found()
+
+    # changes are rare so don't bother finding the affected schema
+    domain_cache.clear()
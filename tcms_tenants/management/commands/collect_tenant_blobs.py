@@ -0,0 +1,47 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove blobs which aren't referenced by any tenant when "
+        "KIWI_TENANTS_DEDUP_STORAGE is enabled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age",
+            action="store",
+            dest="min_age",
+            type=int,
+            default=3600,
+            help="Keep unreferenced blobs modified less than N seconds ago "
+            "b/c they may be in the process of being linked",
+        )
+
+    def handle(self, *args, **kwargs):
+        removed = 0
+        reclaimed = 0
+        threshold = time.time() - kwargs["min_age"]
+
+        for dir_path, _dir_names, file_names in os.walk(default_storage.blob_location):
+            for name in file_names:
+                path = os.path.join(dir_path, name)
+                stat = os.stat(path)
+
+                # the link count is the reference count, 1 means only the blob itself
+                if stat.st_nlink == 1 and stat.st_mtime < threshold:
+                    os.unlink(path)
+                    removed += 1
+                    reclaimed += stat.st_size
+
+        if kwargs["verbosity"]:
+            self.stdout.write(f"Removed {removed} blobs, reclaimed {reclaimed} bytes")
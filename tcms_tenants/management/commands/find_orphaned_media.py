@@ -0,0 +1,150 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from attachments.models import Attachment
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from django_tenants.utils import get_public_schema_name, schema_context
+
+from tcms_tenants.models import PooledSchema, Tenant
+from tcms_tenants.storage import scan
+
+
+class Command(BaseCommand):
+    help = (
+        "Find media directories of tenants which don't exist anymore and files "
+        "which aren't referenced by any attachment. Optionally reclaim them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            action="store",
+            dest="workers",
+            type=int,
+            default=8,
+            help="Number of directory trees scanned in parallel",
+        )
+        parser.add_argument(
+            "--min-age",
+            action="store",
+            dest="min_age",
+            type=int,
+            default=86400,
+            help="Ignore files modified less than N seconds ago b/c they may "
+            "belong to uploads which are still in progress",
+        )
+        parser.add_argument(
+            "--reclaim",
+            action="store_true",
+            dest="reclaim",
+            default=False,
+            help="Move orphaned directories into the trash area and remove "
+            "unreferenced files. Otherwise only report them",
+        )
+
+    def handle(self, *args, **kwargs):
+        # tenant directories are expected to be siblings of each other
+        probe = default_storage.location_for("__probe__")
+        if os.path.basename(probe) != "__probe__":
+            raise CommandError(
+                "MULTITENANT_RELATIVE_MEDIA_ROOT must end with the schema name"
+            )
+        media_root = os.path.dirname(probe)
+
+        # everything else stored under MEDIA_ROOT would look like an orphan
+        if media_root == os.path.abspath(default_storage.base_location):
+            raise CommandError(
+                "MULTITENANT_RELATIVE_MEDIA_ROOT must place tenant directories "
+                "in a sub-directory of MEDIA_ROOT, e.g. 'tenants/%s'"
+            )
+
+        self.threshold = time.time() - kwargs["min_age"]
+        total_bytes = 0
+
+        with schema_context(get_public_schema_name()):
+            tenants = list(Tenant.objects.order_by("pk"))
+            known_schemas = {tenant.schema_name for tenant in tenants}
+            known_schemas.update(
+                PooledSchema.objects.values_list("schema_name", flat=True)
+            )
+
+        orphaned_trees = []
+        if os.path.isdir(media_root):
+            orphaned_trees = [
+                entry.path
+                for entry in os.scandir(media_root)
+                if entry.is_dir(follow_symlinks=False)
+                and entry.name not in known_schemas
+            ]
+
+        # what is referenced from the DB for each tenant
+        references = {}
+        for tenant in tenants:
+            with schema_context(tenant.schema_name):
+                references[tenant.schema_name] = set(
+                    Attachment.objects.values_list("attachment_file", flat=True)
+                )
+
+        with ThreadPoolExecutor(max_workers=kwargs["workers"]) as executor:
+            for path, (tree_bytes, tree_files) in zip(
+                orphaned_trees, executor.map(scan, orphaned_trees)
+            ):
+                total_bytes += tree_bytes
+                self.stdout.write(
+                    f"Orphaned directory '{path}': {tree_bytes} bytes in {tree_files} files"
+                )
+
+                if kwargs["reclaim"]:
+                    default_storage.move_to_trash(path)
+
+            for tenant, unreferenced in zip(
+                tenants,
+                executor.map(
+                    lambda tenant: self.unreferenced_files(
+                        tenant.schema_name, references[tenant.schema_name]
+                    ),
+                    tenants,
+                ),
+            ):
+                for name, size in unreferenced:
+                    total_bytes += size
+                    self.stdout.write(
+                        f"Unreferenced file '{name}' on tenant '{tenant.schema_name}': "
+                        f"{size} bytes"
+                    )
+
+                if kwargs["reclaim"] and unreferenced:
+                    with schema_context(tenant.schema_name):
+                        for name, _size in unreferenced:
+                            default_storage.delete(name)
+
+        action = "Reclaimed" if kwargs["reclaim"] else "Found"
+        self.stdout.write(f"{action} {total_bytes} bytes in total")
+
+    def unreferenced_files(self, schema_name, references):
+        """
+        :return: list of (name, size) for files not referenced by any attachment
+        """
+        location = default_storage.location_for(schema_name)
+        result = []
+
+        for dir_path, _dir_names, file_names in os.walk(location):
+            for file_name in file_names:
+                path = os.path.join(dir_path, file_name)
+                stat = os.stat(path, follow_symlinks=False)
+                if stat.st_mtime >= self.threshold:
+                    continue
+
+                name = default_storage.unsharded_name(os.path.relpath(path, location))
+                if name not in references:
+                    result.append((name, stat.st_size))
+
+        return result
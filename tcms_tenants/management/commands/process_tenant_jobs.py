@@ -0,0 +1,128 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from django_tenants.utils import schema_context
+
+from tcms_tenants.forms import NewTenantForm
+from tcms_tenants.models import ProvisioningJob, Tenant
+from tcms_tenants.utils import create_tenant
+
+
+class WorkerRequest:  # pylint: disable=too-few-public-methods
+    """
+    The bare minimum used by ``utils.create_tenant()``, see
+    ``oss_utils.create_oss_tenant()``!
+    """
+
+    is_secure = True
+
+    def __init__(self, user):
+        self.user = user
+
+
+class Command(BaseCommand):
+    help = "Create tenants requested via NewTenantView in asynchronous mode."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            action="store",
+            dest="interval",
+            type=int,
+            default=0,
+            help="Keep running and check for new jobs every N seconds",
+        )
+        parser.add_argument(
+            "--stale-after",
+            action="store",
+            dest="stale_after",
+            type=int,
+            default=getattr(settings, "KIWI_TENANTS_ASYNC_CREATE_TIMEOUT", 3600),
+            help="Jobs running for more than N seconds are considered abandoned, "
+            "e.g. after a worker crash, and are picked up again",
+        )
+
+    def handle(self, *args, **kwargs):
+        self.verbosity = kwargs["verbosity"]
+        self.stale_after = kwargs["stale_after"]
+
+        while True:
+            while self.process_next():
+                pass
+
+            if not kwargs["interval"]:
+                break
+
+            time.sleep(kwargs["interval"])
+
+    def process_next(self):
+        """
+        :return: False if there are no more pending jobs
+        """
+        stale_before = timezone.now() - datetime.timedelta(seconds=self.stale_after)
+
+        with schema_context("public"):
+            with transaction.atomic():
+                job = (
+                    ProvisioningJob.objects.select_for_update(skip_locked=True)
+                    .filter(
+                        Q(status=ProvisioningJob.PENDING)
+                        | Q(
+                            status=ProvisioningJob.RUNNING,
+                            updated_on__lt=stale_before,
+                        )
+                    )
+                    .order_by("created_on")
+                    .first()
+                )
+                if not job:
+                    return False
+
+                reclaimed = job.status == ProvisioningJob.RUNNING
+                job.status = ProvisioningJob.RUNNING
+                job.save(update_fields=["status", "updated_on"])
+
+            if self.verbosity:
+                self.stdout.write(f"Creating tenant '{job.schema_name}'")
+
+            # the previous worker may have crashed after creating the tenant
+            # which would fail validation b/c the schema name already exists
+            existing = None
+            if reclaimed:
+                existing = Tenant.objects.filter(schema_name=job.schema_name).first()
+
+            try:
+                form = NewTenantForm(job.data)
+                if existing:
+                    job.tenant = existing
+                    job.status = ProvisioningJob.DONE
+                elif form.is_valid():
+                    job.tenant = create_tenant(form, WorkerRequest(job.owner))
+                    job.status = ProvisioningJob.DONE
+                else:
+                    job.error = "\n".join(
+                        f"{field}: {' '.join(errors)}"
+                        for field, errors in form.errors.items()
+                    )
+                    job.status = ProvisioningJob.FAILED
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                job.error = str(err)
+                job.status = ProvisioningJob.FAILED
+
+            job.save()
+
+            if self.verbosity:
+                self.stdout.write(f"Tenant '{job.schema_name}': {job.status}")
+
+        return True
@@ -0,0 +1,79 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from django_tenants.utils import get_public_schema_name, schema_context
+
+from tcms_tenants.models import UserCleanupJob
+from tcms_tenants.utils import remove_user_from_schemas
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove deactivated users from tenant groups & permissions when "
+        "KIWI_TENANTS_DEFER_USER_CLEANUP is enabled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            action="store",
+            dest="interval",
+            type=int,
+            default=0,
+            help="Keep running and check for new jobs every N seconds",
+        )
+
+    def handle(self, *args, **kwargs):
+        self.verbosity = kwargs["verbosity"]
+
+        with schema_context(get_public_schema_name()):
+            while True:
+                while self.process_next():
+                    pass
+
+                if not kwargs["interval"]:
+                    break
+
+                time.sleep(kwargs["interval"])
+
+    def process_next(self):
+        """
+        :return: False if there are no more pending jobs
+        """
+        with transaction.atomic():
+            job = (
+                UserCleanupJob.objects.select_for_update(skip_locked=True)
+                .filter(status=UserCleanupJob.PENDING)
+                .order_by("created_on")
+                .first()
+            )
+            if not job:
+                return False
+
+            try:
+                with transaction.atomic():
+                    job.removed = remove_user_from_schemas(
+                        job.user_id, job.schema_names
+                    )
+                job.status = UserCleanupJob.DONE
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                job.error = str(err)
+                job.status = UserCleanupJob.FAILED
+
+            job.save()
+
+        if self.verbosity:
+            for schema_name, removed in job.removed.items():
+                self.stdout.write(
+                    f"User {job.user_id}: removed {removed} rows from '{schema_name}'"
+                )
+            self.stdout.write(f"User {job.user_id}: {job.status}")
+
+        return True
@@ -0,0 +1,85 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove media directories of deleted tenants from the trash area "
+        "in small chunks so that disk I/O isn't saturated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            action="store",
+            dest="chunk_size",
+            type=int,
+            default=1000,
+            help="Number of files removed before pausing",
+        )
+        parser.add_argument(
+            "--pause",
+            action="store",
+            dest="pause",
+            type=float,
+            default=0.5,
+            help="Seconds to sleep between chunks",
+        )
+        parser.add_argument(
+            "--interval",
+            action="store",
+            dest="interval",
+            type=int,
+            default=0,
+            help="Keep running and check for new trash every N seconds",
+        )
+
+    def handle(self, *args, **kwargs):
+        self.verbosity = kwargs["verbosity"]
+        self.chunk_size = kwargs["chunk_size"]
+        self.pause = kwargs["pause"]
+
+        while True:
+            if os.path.isdir(default_storage.trash_location):
+                for entry in os.scandir(default_storage.trash_location):
+                    self.purge(entry.path)
+
+            if not kwargs["interval"]:
+                break
+
+            time.sleep(kwargs["interval"])
+
+    def purge(self, path):
+        removed = 0
+
+        for dir_path, dir_names, file_names in os.walk(path, topdown=False):
+            for name in file_names:
+                os.unlink(os.path.join(dir_path, name))
+                removed += 1
+
+                if removed % self.chunk_size == 0:
+                    time.sleep(self.pause)
+
+            for name in dir_names:
+                # symlinks to directories are listed here but not walked into
+                full_path = os.path.join(dir_path, name)
+                if os.path.islink(full_path):
+                    os.unlink(full_path)
+                else:
+                    os.rmdir(full_path)
+
+        if os.path.isdir(path) and not os.path.islink(path):
+            os.rmdir(path)
+        else:
+            os.unlink(path)
+
+        if self.verbosity:
+            self.stdout.write(f"Purged {removed} files from '{path}'")
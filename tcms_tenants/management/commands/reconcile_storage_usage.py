@@ -0,0 +1,55 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from django_tenants.utils import get_public_schema_name, schema_context
+
+from tcms_tenants.models import StorageUsage, Tenant
+from tcms_tenants.storage import scan
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculate storage usage for all tenants by scanning their media directories."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            action="store",
+            dest="workers",
+            type=int,
+            default=8,
+            help="Number of directory trees scanned in parallel",
+        )
+
+    def handle(self, *args, **kwargs):
+        with schema_context(get_public_schema_name()):
+            tenants = list(Tenant.objects.order_by("pk"))
+
+            with ThreadPoolExecutor(max_workers=kwargs["workers"]) as executor:
+                results = executor.map(
+                    scan,
+                    [
+                        default_storage.location_for(tenant.schema_name)
+                        for tenant in tenants
+                    ],
+                )
+
+                for tenant, (total_bytes, total_files) in zip(tenants, results):
+                    StorageUsage.objects.update_or_create(
+                        tenant=tenant,
+                        defaults={"bytes": total_bytes, "files": total_files},
+                    )
+
+                    if kwargs["verbosity"]:
+                        self.stdout.write(
+                            f"Tenant '{tenant.schema_name}': {total_bytes} bytes "
+                            f"in {total_files} files"
+                        )
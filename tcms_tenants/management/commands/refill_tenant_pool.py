@@ -0,0 +1,88 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from django_tenants.clone import CloneSchema
+from django_tenants.utils import schema_context, schema_exists
+
+from tcms_tenants.models import PooledSchema
+from tcms_tenants.utils import template_version
+
+
+class Command(BaseCommand):
+    help = (
+        "Keep a pool of schemas cloned from 'empty' which are claimed "
+        "when creating new tenants."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            action="store",
+            dest="size",
+            type=int,
+            default=getattr(settings, "KIWI_TENANTS_POOL_SIZE", 5),
+            help="Number of schemas to keep in the pool",
+        )
+        parser.add_argument(
+            "--interval",
+            action="store",
+            dest="interval",
+            type=int,
+            default=0,
+            help="Keep running and refill the pool every N seconds",
+        )
+
+    def handle(self, *args, **kwargs):
+        self.verbosity = kwargs["verbosity"]
+
+        with schema_context("public"):
+            if not schema_exists("empty"):
+                raise CommandError("Schema 'empty' does not exist")
+
+            while True:
+                self.drop_stale()
+                self.refill(kwargs["size"])
+
+                if not kwargs["interval"]:
+                    break
+
+                time.sleep(kwargs["interval"])
+
+    def drop_stale(self):
+        """
+        Drop pooled schemas which have been cloned before the
+        template schema was migrated!
+        """
+        for pooled in PooledSchema.objects.exclude(template_version=template_version()):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DROP SCHEMA IF EXISTS {connection.ops.quote_name(pooled.schema_name)}"
+                    " CASCADE"
+                )
+            pooled.delete()
+
+            if self.verbosity:
+                self.stdout.write(f"Dropped stale schema '{pooled.schema_name}'")
+
+    def refill(self, size):
+        version = template_version()
+
+        for _i in range(size - PooledSchema.objects.count()):
+            schema_name = f"pool_{uuid.uuid4().hex[:16]}"
+
+            CloneSchema().clone_schema("empty", schema_name, set_connection=False)
+            PooledSchema.objects.create(
+                schema_name=schema_name, template_version=version
+            )
+
+            if self.verbosity:
+                self.stdout.write(f"Cloned schema '{schema_name}'")
@@ -0,0 +1,123 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+import datetime
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from django_tenants.utils import get_public_schema_name, schema_context
+
+from tcms_tenants.models import OutboxEmail
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver emails queued in the outbox when KIWI_TENANTS_EMAIL_OUTBOX "
+        "is enabled. Each batch is sent over a single SMTP connection."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            action="store",
+            dest="batch_size",
+            type=int,
+            default=100,
+            help="Number of messages sent over the same connection",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            action="store",
+            dest="max_attempts",
+            type=int,
+            default=getattr(settings, "KIWI_TENANTS_EMAIL_MAX_ATTEMPTS", 5),
+            help="Mark a message as failed after this many unsuccessful attempts",
+        )
+        parser.add_argument(
+            "--interval",
+            action="store",
+            dest="interval",
+            type=int,
+            default=0,
+            help="Keep running and check for new messages every N seconds",
+        )
+
+    def handle(self, *args, **kwargs):
+        self.verbosity = kwargs["verbosity"]
+        self.max_attempts = kwargs["max_attempts"]
+
+        with schema_context(get_public_schema_name()):
+            while True:
+                while self.send_batch(kwargs["batch_size"]):
+                    pass
+
+                if not kwargs["interval"]:
+                    break
+
+                time.sleep(kwargs["interval"])
+
+    def retry_later(self, email, error):
+        email.attempts += 1
+        email.error = str(error)
+
+        if email.attempts >= self.max_attempts:
+            email.status = OutboxEmail.FAILED
+        else:
+            delay = getattr(settings, "KIWI_TENANTS_EMAIL_RETRY_DELAY", 60)
+            email.next_attempt_on = timezone.now() + datetime.timedelta(
+                seconds=delay * 2 ** (email.attempts - 1)
+            )
+
+    def send_batch(self, batch_size):
+        """
+        :return: False if there are no more messages ready to be sent
+        """
+        with transaction.atomic():
+            emails = list(
+                OutboxEmail.objects.select_for_update(skip_locked=True)
+                .filter(status=OutboxEmail.PENDING, next_attempt_on__lte=timezone.now())
+                .order_by("next_attempt_on", "pk")[:batch_size]
+            )
+            if not emails:
+                return False
+
+            connection = get_connection()
+            try:
+                connection.open()
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                for email in emails:
+                    self.retry_later(email, err)
+            else:
+                for email in emails:
+                    try:
+                        EmailMessage(
+                            email.subject,
+                            email.body,
+                            settings.DEFAULT_FROM_EMAIL,
+                            email.recipients,
+                            connection=connection,
+                        ).send()
+                        email.status = OutboxEmail.SENT
+                        email.sent_on = timezone.now()
+                        email.error = ""
+                    except Exception as err:  # pylint: disable=broad-exception-caught
+                        self.retry_later(email, err)
+            finally:
+                connection.close()
+
+            OutboxEmail.objects.bulk_update(
+                emails, ["status", "attempts", "next_attempt_on", "error", "sent_on"]
+            )
+
+        if self.verbosity:
+            sent = len([email for email in emails if email.status == OutboxEmail.SENT])
+            self.stdout.write(f"Sent {sent} out of {len(emails)} messages")
+
+        return True
@@ -0,0 +1,119 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from django_tenants.utils import get_public_schema_name, schema_context
+
+from tcms_tenants.models import Tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Move existing files into the hashed fan-out layout configured via "
+        "KIWI_TENANTS_STORAGE_SHARD_LEVELS. Safe to interrupt and run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            action="store",
+            dest="workers",
+            type=int,
+            default=8,
+            help="Number of files moved in parallel",
+        )
+        parser.add_argument(
+            "--batch-size",
+            action="store",
+            dest="batch_size",
+            type=int,
+            default=1000,
+            help="Number of files queued for the workers at a time",
+        )
+        parser.add_argument(
+            "--schema",
+            action="append",
+            dest="schema_names",
+            default=[],
+            help="Only process these tenants, may be specified multiple times",
+        )
+
+    def handle(self, *args, **kwargs):
+        if not default_storage.shard_levels:
+            raise CommandError("KIWI_TENANTS_STORAGE_SHARD_LEVELS is not configured")
+
+        with schema_context(get_public_schema_name()):
+            schema_names = kwargs["schema_names"] or list(
+                Tenant.objects.order_by("pk").values_list("schema_name", flat=True)
+            )
+
+        with ThreadPoolExecutor(max_workers=kwargs["workers"]) as executor:
+            for schema_name in schema_names:
+                location = default_storage.location_for(schema_name)
+                legacy_names = self.legacy_names(location)
+                moved = 0
+
+                # don't queue the entire tree at once
+                while batch := list(
+                    itertools.islice(legacy_names, kwargs["batch_size"])
+                ):
+                    moved += sum(
+                        executor.map(
+                            lambda name, location=location: self.move(location, name),
+                            batch,
+                        )
+                    )
+                self.remove_empty_directories(location)
+
+                if kwargs["verbosity"]:
+                    self.stdout.write(f"Tenant '{schema_name}': moved {moved} files")
+
+    def legacy_names(self, location):
+        """
+        Names of files which aren't in the sharded layout yet!
+        """
+        for dir_path, _dir_names, file_names in os.walk(location):
+            for file_name in file_names:
+                name = os.path.relpath(os.path.join(dir_path, file_name), location)
+                name = name.replace("\\", "/")
+
+                # already sharded
+                if default_storage.unsharded_name(name) != name:
+                    continue
+
+                yield name
+
+    @staticmethod
+    def move(location, name):
+        """
+        :return: 1 if the file was moved, 0 otherwise
+        """
+        source = os.path.join(location, name)
+        target = os.path.join(location, default_storage.sharded_name(name))
+
+        # moved by a previous run or a file with the same name was uploaded after
+        # sharding has been enabled. Keep the new one which is what .path() returns
+        if os.path.lexists(target):
+            return 0
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.rename(source, target)
+        except FileNotFoundError:
+            return 0
+
+        return 1
+
+    @staticmethod
+    def remove_empty_directories(location):
+        for dir_path, _dir_names, _file_names in os.walk(location, topdown=False):
+            if dir_path != location and not os.listdir(dir_path):
+                os.rmdir(dir_path)
@@ -1,17 +1,54 @@
-# Copyright (c) 2019-2024 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2019-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
 
 # pylint: disable=too-few-public-methods
+import copy
 from datetime import timedelta
+from http import HTTPStatus
 
 from django.contrib import messages
-from django.http import HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseForbidden
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from tcms_tenants.utils import can_access
+from django_tenants.middleware.main import TenantMainMiddleware
+
+from tcms_tenants.storage import StorageQuotaExceeded
+from tcms_tenants.utils import TenantCache, request_can_access
+
+tenant_cache = TenantCache()
+
+
+class CachedTenantMainMiddleware(TenantMainMiddleware):
+    """
+    Drop-in replacement for
+    ``django_tenants.middleware.main.TenantMainMiddleware`` which
+    resolves hostnames via ``tenant_cache`` before querying the database!
+
+    .. warning:
+
+        This must be the first middleware in the list!
+    """
+
+    def get_tenant(self, domain_model, hostname):
+        tenant = tenant_cache.get(hostname)
+
+        if tenant is None:
+            try:
+                tenant = super().get_tenant(domain_model, hostname)
+            except domain_model.DoesNotExist:
+                tenant_cache.set(hostname, TenantCache.NOT_FOUND)
+                raise
+
+            tenant_cache.set(hostname, tenant)
+
+        if tenant is TenantCache.NOT_FOUND:
+            raise domain_model.DoesNotExist(f'No tenant for hostname "{hostname}"')
+
+        # each request modifies its own copy, e.g. tenant.domain_url
+        return copy.copy(tenant)
 
 
 class BlockUnauthorizedUserMiddleware:
@@ -31,7 +68,7 @@ class BlockUnauthorizedUserMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):  # pylint: disable=no-self-use
-        if not can_access(request.user, request.tenant):
+        if not request_can_access(request):
             return HttpResponseForbidden(_("Unauthorized"))
 
         return self.get_response(request)
@@ -72,3 +109,22 @@ class BlockUnpaidTenantMiddleware:
                 )
 
         return self.get_response(request)
+
+
+class StorageQuotaMiddleware:
+    """
+    Returns 507 Insufficient Storage instead of 500 when an upload
+    is rejected by ``TenantFileSystemStorage`` b/c of the quota!
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):  # pylint: disable=no-self-use
+        if isinstance(exception, StorageQuotaExceeded):
+            return HttpResponse(str(exception), status=HTTPStatus.INSUFFICIENT_STORAGE)
+
+        return None
@@ -0,0 +1,36 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tcms_tenants", "0006_tenant_extra_emails"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PooledSchema",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("schema_name", models.CharField(max_length=63, unique=True)),
+                (
+                    "created_on",
+                    models.DateTimeField(auto_now_add=True, db_index=True),
+                ),
+                ("template_version", models.IntegerField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tcms_tenants", "0010_usercleanupjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StorageUsage",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bytes", models.BigIntegerField(default=0)),
+                ("files", models.IntegerField(default=0)),
+                ("quota", models.BigIntegerField(blank=True, null=True)),
+                ("updated_on", models.DateTimeField(auto_now=True)),
+                (
+                    "tenant",
+                    models.OneToOneField(
+                        on_delete=models.CASCADE,
+                        related_name="storage_usage",
+                        to="tcms_tenants.tenant",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+from django.db.models.functions import Cast, Upper
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tcms_tenants", "0011_storageusage"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+    ] + [
+        migrations.AddIndex(
+            model_name="tenant",
+            index=GinIndex(
+                OpClass(Upper(Cast(field, models.TextField())), name="gin_trgm_ops"),
+                name=f"tenant_{field}_trgm",
+            ),
+        )
+        for field in ("name", "schema_name", "organization")
+    ]
@@ -0,0 +1,24 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tcms_tenants", "0012_tenant_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="provisioningjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(status__in=("pending", "running")),
+                fields=("schema_name",),
+                name="unique_active_provisioning_schema_name",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Case-insensitive lookup of existing usernames when inviting users in bulk,
+    see ``tcms_tenants.utils.create_user_accounts()``. ``auth_user`` lives in
+    the public schema so the index is created only once!
+    """
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("tcms_tenants", "0013_provisioningjob_unique_active_schema_name"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS auth_user_username_lower_idx "
+            'ON auth_user (LOWER("username"))',
+            "DROP INDEX IF EXISTS auth_user_username_lower_idx",
+        ),
+    ]
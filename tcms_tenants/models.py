@@ -6,8 +6,12 @@
 import os
 
 from django.db import models
+from django.db.models.functions import Cast, Upper
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 
 from django_tenants.models import TenantMixin, DomainMixin
 from django_tenants.utils import schema_context
@@ -30,13 +34,24 @@ class Tenant(TenantMixin):
         null=True, blank=True, db_index=True, max_length=256
     )
 
+    class Meta:
+        # trigram indexes matching UPPER(col::text) LIKE UPPER('%term%') which
+        # is what the icontains lookups used by admin search translate to
+        indexes = [
+            GinIndex(
+                OpClass(Upper(Cast(field, models.TextField())), name="gin_trgm_ops"),
+                name=f"tenant_{field}_trgm",
+            )
+            for field in ("name", "schema_name", "organization")
+        ]
+
     def __str__(self):
         return f"[{self.schema_name}] {self.name}"
 
     def delete(self, *args, **kwargs):
         with schema_context(self.schema_name):
             # NOTE: .location is tenant/schema aware
-            default_storage.delete_recursively(default_storage.location)
+            default_storage.move_to_trash(default_storage.location)
 
         super().delete(*args, **kwargs)
 
@@ -51,3 +66,150 @@ Tenant.authorized_users.through.__str__ = _authorized_user_str
 class Domain(DomainMixin):
     def __str__(self):
         return f"{self.domain} for {self.tenant}"
+
+
+class PooledSchema(models.Model):
+    """
+    A schema cloned from ``empty`` which isn't assigned to any tenant yet.
+    Claimed by ``utils.create_tenant()``, see the ``refill_tenant_pool`` command!
+    """
+
+    schema_name = models.CharField(max_length=63, unique=True)
+    created_on = models.DateTimeField(auto_now_add=True, db_index=True)
+    # the last migration applied to ``empty`` at the time of cloning
+    template_version = models.IntegerField(db_index=True)
+
+    def __str__(self):
+        return self.schema_name
+
+
+class ProvisioningJob(models.Model):
+    """
+    A request to create a new tenant, processed asynchronously by the
+    ``process_tenant_jobs`` command when ``KIWI_TENANTS_ASYNC_CREATE`` is set!
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, _("Pending")),
+        (RUNNING, _("Running")),
+        (DONE, _("Done")),
+        (FAILED, _("Failed")),
+    )
+    ACTIVE = (PENDING, RUNNING)
+
+    schema_name = models.CharField(max_length=63, db_index=True)
+    # input for NewTenantForm
+    data = models.JSONField()
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=PENDING, db_index=True
+    )
+    error = models.TextField(blank=True, default="")
+    tenant = models.ForeignKey(Tenant, null=True, blank=True, on_delete=models.SET_NULL)
+    created_on = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # reserves the schema name until the job is finished
+            models.UniqueConstraint(
+                fields=["schema_name"],
+                condition=models.Q(status__in=("pending", "running")),
+                name="unique_active_provisioning_schema_name",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.schema_name}: {self.status}"
+
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be delivered by the ``send_tenant_emails`` command
+    when ``KIWI_TENANTS_EMAIL_OUTBOX`` is set!
+    """
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, _("Pending")),
+        (SENT, _("Sent")),
+        (FAILED, _("Failed")),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    recipients = models.JSONField()
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=PENDING, db_index=True
+    )
+    attempts = models.IntegerField(default=0)
+    next_attempt_on = models.DateTimeField(default=timezone.now, db_index=True)
+    error = models.TextField(blank=True, default="")
+    created_on = models.DateTimeField(auto_now_add=True, db_index=True)
+    sent_on = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject}: {self.status}"
+
+
+class UserCleanupJob(models.Model):
+    """
+    Tenant groups & permissions of a deactivated user which will be removed
+    by the ``process_user_cleanup_jobs`` command when
+    ``KIWI_TENANTS_DEFER_USER_CLEANUP`` is set!
+    """
+
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, _("Pending")),
+        (DONE, _("Done")),
+        (FAILED, _("Failed")),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    schema_names = models.JSONField()
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=PENDING, db_index=True
+    )
+    # schema name -> number of removed rows
+    removed = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True, default="")
+    created_on = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.status}"
+
+
+class StorageUsage(models.Model):
+    """
+    Space used by uploaded files on each tenant. Updated by
+    ``TenantFileSystemStorage`` and recalculated by the
+    ``reconcile_storage_usage`` command!
+    """
+
+    tenant = models.OneToOneField(
+        Tenant, on_delete=models.CASCADE, related_name="storage_usage"
+    )
+    bytes = models.BigIntegerField(default=0)
+    files = models.IntegerField(default=0)
+    # in bytes, falls back to KIWI_TENANTS_STORAGE_QUOTA when empty
+    quota = models.BigIntegerField(null=True, blank=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.tenant.schema_name}: {self.bytes} bytes in {self.files} files"
+
+    @property
+    def effective_quota(self):
+        if self.quota is not None:
+            return self.quota
+        return getattr(settings, "KIWI_TENANTS_STORAGE_QUOTA", None)
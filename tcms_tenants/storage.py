@@ -3,15 +3,67 @@
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
 
+import glob
+import hashlib
 import os
+import re
 import shutil
+import tempfile
+import textwrap
+import uuid
 
 from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.urls import reverse
 from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
 from django.core.files.storage import FileSystemStorage
+from django.utils._os import safe_join
 
 from django_tenants import utils
 
+from tcms_tenants.models import StorageUsage, Tenant
+
+SHARD_DIRECTORY = re.compile(r"^[0-9a-f]{2}$")
+# extended attribute on blobs, shared by all hardlinks b/c they are the same inode
+DIGEST_XATTR = "user.kiwitcms.sha256"
+
+
+class StorageQuotaExceeded(Exception):
+    """
+    Raised when saving a file would exceed the tenant's storage quota,
+    see ``tcms_tenants.middleware.StorageQuotaMiddleware``!
+    """
+
+    def __init__(self, message=_("Storage quota exceeded")):
+        super().__init__(message)
+
+
+def scan(path):
+    """
+    :return: (bytes, files) for all regular files under ``path``
+    """
+    total_bytes = 0
+    total_files = 0
+    directories = [path]
+
+    while directories:
+        try:
+            entries = os.scandir(directories.pop())
+        except FileNotFoundError:
+            continue
+
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total_bytes += entry.stat(follow_symlinks=False).st_size
+                    total_files += 1
+
+    return total_bytes, total_files
+
 
 class TenantFileSystemStorage(FileSystemStorage):
     """
@@ -20,27 +72,382 @@ class TenantFileSystemStorage(FileSystemStorage):
     https://github.com/tomturner/django-tenants/pull/252 gets merged.
     """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # schema_name -> (location, base_url)
+        self._tenant_paths = {}
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+
+        if setting in ("MEDIA_ROOT", "MEDIA_URL", "MULTITENANT_RELATIVE_MEDIA_ROOT"):
+            self.__dict__.pop("relative_media_root", None)
+            self._tenant_paths = {}
+        elif setting == "KIWI_TENANTS_DEDUP_STORAGE":
+            self.__dict__.pop("deduplicate", None)
+        elif setting == "KIWI_TENANTS_STORAGE_SHARD_LEVELS":
+            self.__dict__.pop("shard_levels", None)
+
     @cached_property
     def relative_media_root(self):  # pylint: disable=no-self-use
         return getattr(settings, "MULTITENANT_RELATIVE_MEDIA_ROOT", "%s")
 
-    @property  # not cached like in parent class
+    def _compute_paths(self, schema_name):
+        """
+        The same as ``utils.parse_tenant_config_path()`` but for any schema!
+        """
+        try:
+            relative_path = self.relative_media_root % schema_name
+        except (TypeError, ValueError):
+            relative_path = os.path.join(self.relative_media_root, schema_name)
+
+        location = os.path.abspath(os.path.join(super().location, relative_path))
+
+        base_url = os.path.join(super().base_url, relative_path)
+        if not base_url.endswith("/"):
+            base_url += "/"
+
+        return location, base_url
+
+    def _paths_for(self, schema_name):
+        paths = self._tenant_paths.get(schema_name)
+        if paths is None:
+            paths = self._tenant_paths[schema_name] = self._compute_paths(schema_name)
+        return paths
+
+    @property  # not cached like in parent class, memoized per schema
     def base_url(self):  # pylint: disable=invalid-overridden-method
-        _url = super().base_url
-        _url = os.path.join(
-            _url, utils.parse_tenant_config_path(self.relative_media_root)
-        )
-        if not _url.endswith("/"):
-            _url += "/"
-        return _url
+        return self._paths_for(connection.schema_name)[1]
 
-    @property  # not cached like in parent class
+    @property  # not cached like in parent class, memoized per schema
     def location(self):  # pylint: disable=invalid-overridden-method
-        _location = os.path.join(
-            super().location, utils.parse_tenant_config_path(self.relative_media_root)
+        return self._paths_for(connection.schema_name)[0]
+
+    def location_for(self, schema_name):
+        """
+        Same as ``.location`` but for any tenant, not only the current one!
+        """
+        return self._paths_for(schema_name)[0]
+
+    @cached_property
+    def shard_levels(self):  # pylint: disable=no-self-use
+        return getattr(settings, "KIWI_TENANTS_STORAGE_SHARD_LEVELS", 0)
+
+    def sharded_name(self, name):
+        """
+        Prefix ``name`` with directories made of its hash, e.g. ``ab/cd/name``
+        so that files are spread evenly across many small directories!
+        """
+        name = str(name).replace("\\", "/")
+        digest = hashlib.md5(name.encode(), usedforsecurity=False).hexdigest()
+        return "/".join(textwrap.wrap(digest, 2)[: self.shard_levels] + [name])
+
+    def unsharded_name(self, relative_path):
+        """
+        The opposite of ``sharded_name()``. Works for paths which
+        are not in the sharded layout as well!
+        """
+        relative_path = str(relative_path).replace("\\", "/")
+        if not self.shard_levels:
+            return relative_path
+
+        parts = relative_path.split("/", self.shard_levels)
+        if (
+            len(parts) > self.shard_levels
+            and self.sharded_name(parts[-1]) == relative_path
+        ):
+            return parts[-1]
+
+        return relative_path
+
+    def path(self, name):
+        """
+        When ``KIWI_TENANTS_STORAGE_SHARD_LEVELS`` is set files are stored in a
+        hashed fan-out layout. Files which haven't been moved yet, see the
+        ``shard_tenant_media`` command, are still found at their old location!
+        """
+        legacy_path = super().path(name)
+        if not self.shard_levels:
+            return legacy_path
+
+        sharded_path = safe_join(self.location, self.sharded_name(name))
+        if not os.path.lexists(sharded_path) and os.path.lexists(legacy_path):
+            return legacy_path
+
+        return sharded_path
+
+    def url(self, name):
+        """
+        Files are served via the ``tcms_tenants:serve-media`` view, which checks
+        access to the tenant, when ``KIWI_TENANTS_MEDIA_SENDFILE`` is set.
+        Also when sharding b/c then files aren't where ``MEDIA_URL`` expects them!
+        """
+        if not self.shard_levels and not getattr(
+            settings, "KIWI_TENANTS_MEDIA_SENDFILE", None
+        ):
+            return super().url(name)
+
+        return reverse("tcms_tenants:serve-media", args=[str(name).lstrip("/")])
+
+    def listdir(self, path):
+        """
+        In the sharded layout the contents of a directory are spread across
+        many fan-out directories, e.g. ``*/*/<path>``, so look in all of them
+        in addition to the legacy location!
+
+        This is O(number of fan-out directories), up to 65536 with 2 levels,
+        and is meant for management commands. Nothing on the request path
+        may call it!
+        """
+        if not self.shard_levels:
+            return super().listdir(path)
+
+        path = str(path).replace("\\", "/").strip("/")
+        location = self.location
+        legacy_path = safe_join(location, path)
+        candidates = [
+            candidate
+            for candidate in glob.glob(
+                os.path.join(
+                    glob.escape(location),
+                    *["[0-9a-f][0-9a-f]"] * self.shard_levels,
+                    glob.escape(path),
+                )
+            )
+            if os.path.isdir(candidate)
+        ]
+        if os.path.isdir(legacy_path):
+            candidates.append(legacy_path)
+
+        directories, files = set(), set()
+        for candidate in candidates:
+            for entry in os.scandir(candidate):
+                name = f"{path}/{entry.name}" if path else entry.name
+
+                if entry.is_dir():
+                    # fan-out directories themselves aren't part of the listing
+                    if (
+                        path
+                        or candidate != legacy_path
+                        or not SHARD_DIRECTORY.match(entry.name)
+                    ):
+                        directories.add(entry.name)
+                elif self.unsharded_name(os.path.relpath(entry.path, location)) == name:
+                    files.add(entry.name)
+
+        return sorted(directories), sorted(files)
+
+    def usage(self):
+        """
+        :return: storage usage for the current tenant or None, in which
+                 case usage isn't tracked and quota isn't enforced
+        """
+        with utils.schema_context(utils.get_public_schema_name()):
+            tenant = Tenant.objects.filter(schema_name=connection.schema_name).first()
+            if not tenant:
+                return None
+
+            # records for tenants created before usage tracking are added by
+            # the reconcile_storage_usage command b/c it needs to scan the disk
+            return StorageUsage.objects.filter(tenant=tenant).first()
+
+    @staticmethod
+    def _update_usage(usage, size, files):
+        if usage:
+            with utils.schema_context(utils.get_public_schema_name()):
+                StorageUsage.objects.filter(pk=usage.pk).update(
+                    bytes=F("bytes") + size, files=F("files") + files
+                )
+
+    @staticmethod
+    def _reserve_usage(usage, size):
+        """
+        Account for a new file only if it fits within the quota. Checked and
+        updated in a single query so that parallel uploads can't exceed it!
+        """
+        if not usage:
+            return
+
+        default_quota = getattr(settings, "KIWI_TENANTS_STORAGE_QUOTA", None)
+        within_quota = Q(quota__isnull=False, bytes__lte=F("quota") - size)
+        if default_quota is None:
+            within_quota |= Q(quota__isnull=True)
+        else:
+            within_quota |= Q(quota__isnull=True, bytes__lte=default_quota - size)
+
+        with utils.schema_context(utils.get_public_schema_name()):
+            reserved = StorageUsage.objects.filter(within_quota, pk=usage.pk).update(
+                bytes=F("bytes") + size, files=F("files") + 1
+            )
+
+        if not reserved:
+            raise StorageQuotaExceeded()
+
+    @cached_property
+    def deduplicate(self):  # pylint: disable=no-self-use
+        return getattr(settings, "KIWI_TENANTS_DEDUP_STORAGE", False)
+
+    @property
+    def blob_location(self):
+        """
+        Shared area where file contents are stored under their hash when
+        ``KIWI_TENANTS_DEDUP_STORAGE`` is enabled. Must be on the same
+        filesystem as ``MEDIA_ROOT`` b/c tenant files are hardlinks to blobs!
+        """
+        return os.path.abspath(
+            getattr(
+                settings,
+                "KIWI_TENANTS_BLOB_ROOT",
+                os.path.abspath(self.base_location) + ".blobs",
+            )
         )
-        return os.path.abspath(_location)
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_location, digest[:2], digest[2:4], digest)
+
+    @staticmethod
+    def file_digest(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as fobj:
+            for chunk in iter(lambda: fobj.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def stored_digest(path):
+        """
+        :return: the digest recorded when the blob behind ``path`` was
+                 stored or None if the filesystem doesn't support it
+        """
+        try:
+            return os.getxattr(path, DIGEST_XATTR).decode()
+        except (AttributeError, OSError):
+            return None
+
+    def _store_blob(self, content):
+        """
+        Write ``content`` into the blob area unless a blob with the
+        same hash already exists!
+
+        :return: path to the blob
+        """
+        os.makedirs(self.blob_location, exist_ok=True)
+        digest = hashlib.sha256()
+
+        with tempfile.NamedTemporaryFile(dir=self.blob_location, delete=False) as tmp:
+            for chunk in content.chunks():
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                digest.update(chunk)
+                tmp.write(chunk)
+
+        blob = self.blob_path(digest.hexdigest())
+        if os.path.exists(blob):
+            os.unlink(tmp.name)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp.name, self.file_permissions_mode)
+            try:
+                os.setxattr(tmp.name, DIGEST_XATTR, digest.hexdigest().encode())
+            except (AttributeError, OSError):
+                # not supported, blob is left for collect_tenant_blobs on delete
+                pass
+            os.replace(tmp.name, blob)
+
+        return blob
+
+    def _save_deduplicated(self, name, content):
+        blob = self._store_blob(content)
+
+        while True:
+            full_path = self.path(name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+            try:
+                os.link(blob, full_path)
+                break
+            except FileExistsError:
+                name = self.get_available_name(name)
+            except FileNotFoundError:
+                # blob has been garbage collected in the meantime
+                blob = self._store_blob(content)
+            except OSError:
+                # hardlinks not supported, keep a separate copy
+                shutil.copyfile(blob, full_path)
+                break
+
+        return str(name).replace("\\", "/")
+
+    def _save(self, name, content):
+        size = content.size
+        usage = self.usage()
+        self._reserve_usage(usage, size)
+
+        try:
+            if self.deduplicate:
+                return self._save_deduplicated(name, content)
+            return super()._save(name, content)
+        except Exception:
+            self._update_usage(usage, -size, -1)
+            raise
+
+    def delete(self, name):
+        path = self.path(name)
+        if not os.path.isfile(path):
+            super().delete(name)
+            return
+
+        stat = os.stat(path)
+        blob = None
+        # the link count is the reference count, 2 means only this file & the blob
+        if self.deduplicate and stat.st_nlink == 2:
+            digest = self.stored_digest(path)
+            if digest:
+                blob = self.blob_path(digest)
+                if not os.path.exists(blob) or not os.path.samefile(path, blob):
+                    blob = None
+
+        super().delete(name)
+        self._update_usage(self.usage(), -stat.st_size, -1)
+
+        if blob and os.stat(blob).st_nlink == 1:
+            os.unlink(blob)
 
     def delete_recursively(self, path):
         if self.exists(path):
             shutil.rmtree(path)
+
+    @property
+    def trash_location(self):
+        """
+        Directory where media of deleted tenants is moved before being purged.
+        Defaults to a sibling of ``MEDIA_ROOT`` so that it isn't publicly served
+        but is likely on the same filesystem!
+        """
+        return os.path.abspath(
+            getattr(
+                settings,
+                "KIWI_TENANTS_MEDIA_TRASH",
+                os.path.abspath(self.base_location) + ".trash",
+            )
+        )
+
+    def move_to_trash(self, path):
+        """
+        Atomically rename ``path`` into the trash area, see the
+        ``purge_tenant_trash`` command. If that isn't possible, e.g. the trash
+        is on a different filesystem, then ``path`` is removed immediately!
+        """
+        if not os.path.lexists(path):
+            return
+
+        os.makedirs(self.trash_location, exist_ok=True)
+        target = os.path.join(
+            self.trash_location, f"{os.path.basename(path)}.{uuid.uuid4().hex}"
+        )
+
+        try:
+            os.rename(path, target)
+        except OSError:
+            self.delete_recursively(path)
@@ -2,6 +2,7 @@
 
 # Licensed under the GPL 3.0: https://www.gnu.org/licenses/gpl-3.0.txt
 
+from django.core.cache import cache
 from django.db import connection, transaction
 from django.db.utils import ProgrammingError
 from django.conf import settings
@@ -15,6 +16,8 @@ from django_tenants.test.cases import FastTenantTestCase
 from django_tenants.utils import get_tenant_model, schema_context, tenant_context
 
 from tcms.tests.factories import TestPlanFactory
+from tcms_tenants.middleware import tenant_cache
+from tcms_tenants.utils import domain_cache
 from tenant_groups.models import Group as TenantGroup
 
 
@@ -69,6 +72,11 @@ class LoggedInTestCase(FastTenantTestCase):
     def setUp(self):
         super().setUp()
 
+        # DB changes are rolled back between tests but cached values are not
+        cache.clear()
+        tenant_cache.clear()
+        domain_cache.clear()
+
         self.client = TenantClient(self.tenant)
         self.client.login(
             username=self.tester.username,  # nosec:B106:hardcoded_password_funcarg
@@ -0,0 +1,89 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+"""
+Micro-benchmark for ``TenantFileSystemStorage.location`` & ``.base_url``
+compared to the implementation before they were memoized per schema.
+Doesn't need a database, execute with::
+
+    PYTHONPATH=.:../Kiwi/ KIWI_TENANTS_DOMAIN=test.com \\
+        python -m tcms_tenants.tests.benchmark_storage
+"""
+
+import os
+import timeit
+
+import django
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.functional import cached_property
+
+NUMBER = 100_000
+SCHEMAS = [f"tenant{i}" for i in range(10)]
+
+
+def baseline_storage_class():
+    """
+    ``TenantFileSystemStorage`` as it was before memoization, kept here
+    for comparison!
+    """
+    from django_tenants import utils  # pylint: disable=import-outside-toplevel
+
+    class BaselineStorage(FileSystemStorage):
+        @cached_property
+        def relative_media_root(self):  # pylint: disable=no-self-use
+            return getattr(settings, "MULTITENANT_RELATIVE_MEDIA_ROOT", "%s")
+
+        @property  # not cached like in parent class
+        def base_url(self):  # pylint: disable=invalid-overridden-method
+            _url = super().base_url
+            _url = os.path.join(
+                _url, utils.parse_tenant_config_path(self.relative_media_root)
+            )
+            if not _url.endswith("/"):
+                _url += "/"
+            return _url
+
+        @property  # not cached like in parent class
+        def location(self):  # pylint: disable=invalid-overridden-method
+            _location = os.path.join(
+                super().location,
+                utils.parse_tenant_config_path(self.relative_media_root),
+            )
+            return os.path.abspath(_location)
+
+    return BaselineStorage
+
+
+def main():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "test_project.settings")
+    django.setup()
+
+    # pylint: disable=import-outside-toplevel
+    from django.db import connection
+    from tcms_tenants.storage import TenantFileSystemStorage
+
+    def access(storage):
+        def func():
+            for schema_name in SCHEMAS:
+                connection.set_schema(schema_name)
+                storage.location  # pylint: disable=pointless-statement
+                storage.base_url  # pylint: disable=pointless-statement
+
+        return func
+
+    calls = NUMBER * len(SCHEMAS)
+    for name, storage in (
+        ("before", baseline_storage_class()()),
+        ("after", TenantFileSystemStorage()),
+    ):
+        seconds = timeit.timeit(access(storage), number=NUMBER)
+        print(f"{name:>6}: {seconds * 1_000_000_000 / calls:8.1f} ns per schema")
+
+    connection.set_schema_to_public()
+
+
+if __name__ == "__main__":
+    main()
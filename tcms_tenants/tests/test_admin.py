@@ -4,10 +4,17 @@
 # https://www.gnu.org/licenses/agpl-3.0.html
 
 # pylint: disable=too-many-ancestors
+import csv
 from http import HTTPStatus
+from unittest.mock import patch
 
+from django.contrib import admin
 from django.contrib.auth.models import Permission
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -15,6 +22,7 @@ from django.utils.translation import gettext_lazy as _
 from django_tenants import utils
 
 from tcms.utils.user import deactivate
+from tcms_tenants.models import Domain, StorageUsage, Tenant, UserCleanupJob
 from tcms_tenants.tests import LoggedInTestCase, TenantGroupsTestCase
 from tcms_tenants.tests import UserFactory
 from tenant_groups.models import Group as TenantGroup
@@ -71,6 +79,141 @@ class TenantAdminTestCase(LoggedInTestCase):
             response, self.tenant.domains.filter(is_primary=True).first().domain
         )
 
+    def _create_tenants(self, count, name="Extra"):
+        original_value = Tenant.auto_create_schema
+        Tenant.auto_create_schema = False
+        try:
+            with utils.schema_context("public"):
+                for i in range(count):
+                    tenant = Tenant.objects.create(
+                        schema_name=f"{name.lower()}{i}",
+                        name=f"{name} {i}",
+                        owner=UserFactory(),
+                    )
+                    tenant.authorized_users.add(tenant.owner, self.tester)
+                    Domain.objects.create(
+                        tenant=tenant,
+                        domain=f"{name.lower()}{i}.example.com",
+                        is_primary=True,
+                    )
+                    StorageUsage.objects.create(tenant=tenant, bytes=1024 * i, files=i)
+        finally:
+            Tenant.auto_create_schema = original_value
+
+    def _changelist_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("admin:tcms_tenants_tenant_changelist"))
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+
+        return len(context.captured_queries)
+
+    def test_changelist_query_count_doesnt_depend_on_number_of_tenants(self):
+        self.tester.is_superuser = True
+        self.tester.save()
+
+        # warm up caches populated on first access
+        self._changelist_queries()
+        initial_count = self._changelist_queries()
+
+        self._create_tenants(5)
+
+        self.assertEqual(self._changelist_queries(), initial_count)
+
+        response = self.client.get(reverse("admin:tcms_tenants_tenant_changelist"))
+        for i in range(5):
+            self.assertContains(response, f"extra{i}.example.com")
+
+    def _walk_pages(self, url):
+        schema_names = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+
+            changelist = response.context["cl"]
+            schema_names.extend(tenant.schema_name for tenant in changelist.result_list)
+            self.assertLessEqual(len(changelist.result_list), 2)
+            if changelist.next_page_url:
+                url = (
+                    reverse("admin:tcms_tenants_tenant_changelist")
+                    + changelist.next_page_url
+                )
+            else:
+                url = None
+
+        return schema_names
+
+    def test_changelist_uses_keyset_pagination(self):
+        self.tester.is_superuser = True
+        self.tester.save()
+        self._create_tenants(5)
+
+        with utils.schema_context("public"):
+            expected = list(
+                Tenant.objects.order_by("-created_on", "-pk").values_list(
+                    "schema_name", flat=True
+                )
+            )
+
+        tenant_admin = admin.site._registry[Tenant]  # pylint: disable=protected-access
+        with patch.object(tenant_admin, "list_per_page", 2):
+            self.assertEqual(
+                self._walk_pages(reverse("admin:tcms_tenants_tenant_changelist")),
+                expected,
+            )
+
+    def test_search_results_are_ranked_by_similarity(self):
+        self.tester.is_superuser = True
+        self.tester.save()
+
+        # created later means listed first in the default order
+        self._create_tenants(1, name="Acme")
+        self._create_tenants(1, name="AcmeCorporationEurope")
+
+        response = self.client.get(
+            reverse("admin:tcms_tenants_tenant_changelist") + "?q=acme"
+        )
+        self.assertEqual(
+            [tenant.schema_name for tenant in response.context["cl"].result_list],
+            ["acme0", "acmecorporationeurope0"],
+        )
+
+        # explicit sorting takes precedence
+        response = self.client.get(
+            reverse("admin:tcms_tenants_tenant_changelist") + "?q=acme&o=-5"
+        )
+        self.assertEqual(
+            [tenant.schema_name for tenant in response.context["cl"].result_list],
+            ["acmecorporationeurope0", "acme0"],
+        )
+
+    def test_changelist_with_invalid_cursor(self):
+        self.tester.is_superuser = True
+        self.tester.save()
+
+        response = self.client.get(
+            reverse("admin:tcms_tenants_tenant_changelist") + "?cursor=invalid"
+        )
+        self.assertRedirects(
+            response,
+            reverse("admin:tcms_tenants_tenant_changelist") + "?e=1",
+            fetch_redirect_response=False,
+        )
+
+    @override_settings(KIWI_TENANTS_ADMIN_ESTIMATED_COUNT_THRESHOLD=1000)
+    def test_changelist_displays_estimated_count_for_large_tables(self):
+        self.tester.is_superuser = True
+        self.tester.save()
+
+        with patch("tcms_tenants.admin.estimated_count", return_value=54321):
+            response = self.client.get(reverse("admin:tcms_tenants_tenant_changelist"))
+            self.assertContains(response, "54321 tenants")
+
+            # exact count when searching
+            response = self.client.get(
+                reverse("admin:tcms_tenants_tenant_changelist") + "?q=fast"
+            )
+            self.assertNotContains(response, "54321")
+
     def test_superuser_can_delete_tenant(self):
         self.tester.is_superuser = True
         self.tester.save()
@@ -221,6 +364,34 @@ class AuthorizedUsersAdminAndTenantGroups(TenantGroupsTestCase):
         self.assertTrue(tester2.tenant_groups.filter(name="AuthorizedUsers").exists())
         self.assertFalse(tester2.tenant_groups.filter(name="Tester").exists())
 
+    def _changelist_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse("admin:tcms_tenants_tenant_authorized_users_changelist")
+            )
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+
+        return response, len(context.captured_queries)
+
+    def test_changelist_query_count_doesnt_depend_on_number_of_users(self):
+        # warm up caches populated on first access
+        self._changelist_queries()
+        _response, initial_count = self._changelist_queries()
+
+        with utils.tenant_context(self.tenant):
+            tester_group = TenantGroup.objects.get(name="Tester")
+
+        for _i in range(5):
+            user = UserFactory()
+            self.tenant.authorized_users.add(user)
+            with utils.tenant_context(self.tenant):
+                tester_group.user_set.add(user)
+
+        response, count = self._changelist_queries()
+        self.assertEqual(count, initial_count)
+        # owner is a member of both groups, listed by name
+        self.assertContains(response, "Administrator, Tester")
+
     def test_when_removing_authorized_users_they_are_removed_from_default_groups(self):
         user_to_be_deleted = UserFactory()
 
@@ -264,6 +435,110 @@ class AuthorizedUsersAdminAndTenantGroups(TenantGroupsTestCase):
         )
 
 
+@override_settings(KIWI_TENANTS_IMPORT_BATCH_SIZE=2)
+class ImportAuthorizedUsersTestCase(TenantGroupsTestCase):
+    def test_changelist_links_to_import(self):
+        response = self.client.get(
+            reverse("admin:tcms_tenants_tenant_authorized_users_changelist")
+        )
+        self.assertContains(
+            response, reverse("admin:tcms_tenants_tenant_authorized_users_import")
+        )
+
+    def test_import_page_is_displayed(self):
+        response = self.client.get(
+            reverse("admin:tcms_tenants_tenant_authorized_users_import")
+        )
+        self.assertContains(response, "Import authorized users")
+        self.assertContains(response, 'enctype="multipart/form-data"')
+
+    def test_non_authorized_user_cant_import(self):
+        # can reach the admin b/c the tenant is publicly readable but
+        # isn't authorized to change anything
+        self.tenant.publicly_readable = True
+        self.tenant.save()
+
+        user = UserFactory()
+        user.set_password("password")
+        user.save()
+        self.client.login(
+            username=user.username,  # nosec:B106:hardcoded_password_funcarg
+            password="password",
+        )
+
+        response = self.client.get(
+            reverse("admin:tcms_tenants_tenant_authorized_users_import")
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+    def test_import_authorizes_users_and_returns_report(self):
+        existing = UserFactory()
+        content = "\n".join(
+            [
+                "name,email",
+                f"Existing,{existing.email}",
+                "New,imported-1@example.com",
+                "Invalid,not-an-email",
+                f"Tester,{self.tester.email}",
+                "Other,Imported-2@Example.com",
+            ]
+        )
+
+        response = self.client.post(
+            reverse("admin:tcms_tenants_tenant_authorized_users_import"),
+            {
+                "file": SimpleUploadedFile("users.csv", content.encode("utf-8")),
+                "notify_via_email": "",
+            },
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response["Content-Type"], "text/csv")
+
+        report = list(csv.reader(response.content.decode("utf-8").splitlines()))
+        self.assertEqual(report[0], ["email", "status", "reason"])
+        self.assertEqual(
+            [row[:2] for row in report[1:]],
+            [
+                [existing.email, "invited"],
+                ["imported-1@example.com", "created-account"],
+                ["not-an-email", "invalid"],
+                [self.tester.email, "already-authorized"],
+                ["Imported-2@Example.com", "created-account"],
+            ],
+        )
+        self.assertNotEqual(report[3][2], "")
+
+        for email in [
+            existing.email,
+            "imported-1@example.com",
+            "imported-2@example.com",
+        ]:
+            user = self.tenant.authorized_users.get(email=email)
+            self.assertTrue(user.tenant_groups.filter(name="Tester").exists())
+
+    def test_non_utf8_file_is_rejected_before_importing(self):
+        content = (
+            "name,email\nfirst,imported-cp1252@example.com\nJosé,jose@example.com\n"
+        )
+
+        response = self.client.post(
+            reverse("admin:tcms_tenants_tenant_authorized_users_import"),
+            {
+                "file": SimpleUploadedFile("users.csv", content.encode("cp1252")),
+                "notify_via_email": "",
+            },
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(
+            response, "File must be a UTF-8 encoded CSV or JSON Lines file"
+        )
+        self.assertFalse(
+            self.tenant.authorized_users.filter(
+                email="imported-cp1252@example.com"
+            ).exists()
+        )
+
+
 class DeactivateUserTestCase(TenantGroupsTestCase):
     @classmethod
     def setUpClass(cls):
@@ -342,3 +617,30 @@ class DeactivateUserTestCase(TenantGroupsTestCase):
             self.assertTrue(TenantGroup.objects.filter(name="Administrator").exists())
             self.assertTrue(TenantGroup.objects.filter(name="Tester").exists())
             self.assertTrue(TenantGroup.objects.filter(name="ProductManager").exists())
+
+    @override_settings(KIWI_TENANTS_DEFER_USER_CLEANUP=True)
+    def test_when_cleanup_is_deferred_access_is_removed_immediately(self):
+        deactivate(self.user2)
+
+        # SUT is not authorized
+        self.assertFalse(self.tenant.authorized_users.filter(pk=self.user2.pk).exists())
+
+        # but groups and permissions are still there
+        with utils.tenant_context(self.tenant):
+            self.assertEqual(self.user2.tenant_groups.count(), 1)
+            self.assertGreater(self.user2.user_permissions.count(), 0)
+            permissions_count = self.user2.user_permissions.count()
+
+        job = UserCleanupJob.objects.get(user=self.user2)
+        self.assertEqual(job.status, UserCleanupJob.PENDING)
+        self.assertEqual(job.schema_names, [self.tenant.schema_name])
+
+        call_command("process_user_cleanup_jobs", verbosity=0)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, UserCleanupJob.DONE)
+        self.assertEqual(job.removed, {self.tenant.schema_name: permissions_count + 1})
+
+        with utils.tenant_context(self.tenant):
+            self.assertEqual(self.user2.tenant_groups.count(), 0)
+            self.assertEqual(self.user2.user_permissions.count(), 0)
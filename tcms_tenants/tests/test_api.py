@@ -127,3 +127,84 @@ class TenantInviteApiTestCase(TenantGroupsTestCase):
             90,
             UserModel.objects.filter(username__startswith="invited-silently").count(),
         )
+
+    @patch("tcms.core.utils.mailto.send_mail")
+    def test_blank_addresses_are_skipped(self, send_mail):
+        response = self.client.post(
+            "/json-rpc/",
+            {
+                "id": "jsonrpc",
+                "jsonrpc": "2.0",
+                "method": "Tenant.invite",
+                "params": [["", "  ", "invited-not-blank@example.com"], True],
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(HTTPStatus.OK, response.status_code)
+
+        data = json.loads(response.content)["result"]
+        self.assertEqual(data["success"], ["", "  ", "invited-not-blank@example.com"])
+        self.assertEqual(data["errored"], [])
+
+        self.assertEqual(send_mail.call_count, 1)
+        self.assertTrue(
+            UserModel.objects.filter(email="invited-not-blank@example.com").exists()
+        )
+
+
+class TenantInviteBulkApiTestCase(TenantGroupsTestCase):
+    @override_settings(DEFAULT_GROUPS=["InvitedUsers"])
+    @patch("tcms.core.utils.mailto.send_mail")
+    def test_returns_status_for_each_address(self, send_mail):
+        with utils.tenant_context(self.tenant):
+            TenantGroup.objects.create(name="InvitedUsers")
+
+        existing_user = UserModel.objects.create(
+            username="invited-existing", email="invited-existing@example.com"
+        )
+
+        response = self.client.post(
+            "/json-rpc/",
+            {
+                "id": "jsonrpc",
+                "jsonrpc": "2.0",
+                "method": "Tenant.invite_bulk",
+                "params": [
+                    [
+                        "invited-bulk@example.com",
+                        existing_user.email,
+                        self.tester.email,
+                        "invalid-bulk@example.",
+                    ],
+                    True,
+                ],
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(HTTPStatus.OK, response.status_code)
+
+        data = json.loads(response.content)["result"]
+        self.assertEqual(len(data), 4)
+
+        self.assertEqual(
+            data[0], {"email": "invited-bulk@example.com", "status": "created-account"}
+        )
+        self.assertEqual(data[1], {"email": existing_user.email, "status": "invited"})
+        self.assertEqual(
+            data[2], {"email": self.tester.email, "status": "already-authorized"}
+        )
+        self.assertEqual(data[3]["email"], "invalid-bulk@example.")
+        self.assertEqual(data[3]["status"], "invalid")
+        self.assertIn("reason", data[3])
+
+        # only newly authorized users are notified
+        self.assertEqual(send_mail.call_count, 2)
+
+        for email in ("invited-bulk@example.com", existing_user.email):
+            invited_user = UserModel.objects.get(email=email)
+            self.assertTrue(
+                self.tenant.authorized_users.filter(pk=invited_user.pk).exists()
+            )
+            self.assertTrue(
+                invited_user.tenant_groups.filter(name="InvitedUsers").exists()
+            )
@@ -1,21 +1,34 @@
-# Copyright (c) 2019-2024 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2019-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
 
 # pylint: disable=too-many-ancestors
 from datetime import timedelta
+from http import HTTPStatus
 
 from django.conf import settings
 from django.test import modify_settings
+from django.test import override_settings
+from django.test import SimpleTestCase
 from django.test import TestCase
 from django.test.client import RequestFactory
 from django.utils import timezone
-from django.http import HttpResponseForbidden, HttpResponseNotFound
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    HttpResponseNotFound,
+)
+from django_tenants.utils import schema_context
 
 from tcms_tenants.tests import LoggedInTestCase
 from tcms_tenants.context_processors import schema_name_processor
 from tcms_tenants.context_processors import tenant_navbar_processor
+from tcms_tenants.middleware import CachedTenantMainMiddleware, StorageQuotaMiddleware
+from tcms_tenants.storage import StorageQuotaExceeded
+from tcms_tenants.utils import TenantCache
+from tcms_tenants.models import Domain, Tenant
 
 
 class ContextProcessor(TestCase):
@@ -43,7 +56,8 @@ class BlockUnauthorizedUserMiddlewareTestCase(LoggedInTestCase):
     def test_unauthorized_user_cant_access_tenant(self):
         self.assertFalse(self.tenant.publicly_readable)
 
-        self.tenant.authorized_users.remove(self.tester)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tenant.authorized_users.remove(self.tester)
         response = self.client.get("/")
 
         self.assertIsInstance(response, HttpResponseForbidden)
@@ -113,6 +127,25 @@ class BlockUnpaidTenantMiddlewareTestCase(LoggedInTestCase):
         self.assertContains(response, "DASHBOARD")
 
 
+class StorageQuotaMiddlewareTestCase(SimpleTestCase):
+    def setUp(self):
+        self.middleware = StorageQuotaMiddleware(lambda request: HttpResponse())
+        self.request = RequestFactory().post("/attachments/add/")
+
+    def test_quota_exceeded_returns_insufficient_storage(self):
+        response = self.middleware.process_exception(
+            self.request, StorageQuotaExceeded()
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.INSUFFICIENT_STORAGE)
+        self.assertEqual(response.content, b"Storage quota exceeded")
+
+    def test_other_exceptions_are_not_handled(self):
+        self.assertIsNone(
+            self.middleware.process_exception(self.request, ValueError("boom"))
+        )
+
+
 class InvalidHostname(LoggedInTestCase):
     @classmethod
     def get_test_tenant_domain(cls):
@@ -128,3 +161,96 @@ class InvalidHostname(LoggedInTestCase):
         response = self.client.get("/")
 
         self.assertIsInstance(response, HttpResponseNotFound)
+
+
+class TenantCacheTestCase(SimpleTestCase):
+    @override_settings(KIWI_TENANTS_HOST_CACHE_SIZE=2)
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = TenantCache()
+        cache.set("one.example.com", "one")
+        cache.set("two.example.com", "two")
+
+        # mark as recently used
+        self.assertEqual(cache.get("one.example.com"), "one")
+
+        cache.set("three.example.com", "three")
+
+        self.assertEqual(cache.get("one.example.com"), "one")
+        self.assertIsNone(cache.get("two.example.com"))
+        self.assertEqual(cache.get("three.example.com"), "three")
+
+    @override_settings(
+        KIWI_TENANTS_HOST_CACHE_TTL=60, KIWI_TENANTS_HOST_NOT_FOUND_TTL=-1
+    )
+    def test_unknown_keys_expire_sooner(self):
+        cache = TenantCache()
+        cache.set("one.example.com", "one")
+        cache.set("unknown.example.com", TenantCache.NOT_FOUND)
+
+        self.assertEqual(cache.get("one.example.com"), "one")
+        self.assertIsNone(cache.get("unknown.example.com"))
+
+    def test_clear_not_found_keeps_known_keys(self):
+        cache = TenantCache()
+        cache.set("one.example.com", "one")
+        cache.set("unknown.example.com", TenantCache.NOT_FOUND)
+
+        cache.clear_not_found()
+        self.assertEqual(cache.get("one.example.com"), "one")
+        self.assertIsNone(cache.get("unknown.example.com"))
+
+    @override_settings(KIWI_TENANTS_HOST_CACHE_TTL=-1)
+    def test_expired_entries_are_not_returned(self):
+        cache = TenantCache()
+        cache.set("one.example.com", "one")
+
+        self.assertIsNone(cache.get("one.example.com"))
+
+
+class CachedTenantMainMiddlewareTestCase(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        self.middleware = CachedTenantMainMiddleware(lambda request: HttpResponse())
+
+    def resolve(self, hostname=None):
+        request = RequestFactory().get(
+            "/", HTTP_HOST=hostname or self.get_test_tenant_domain()
+        )
+        self.middleware.process_request(request)
+        return request.tenant
+
+    def test_tenant_is_resolved_without_database_queries(self):
+        self.assertEqual(self.resolve().pk, self.tenant.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolve().pk, self.tenant.pk)
+
+    def test_cache_is_invalidated_when_tenant_is_saved(self):
+        self.assertNotEqual(self.resolve().name, "Invalidated")
+
+        with schema_context("public"):
+            # a copy b/c self.tenant is shared between test classes
+            tenant = Tenant.objects.get(pk=self.tenant.pk)
+            tenant.name = "Invalidated"
+            tenant.save()
+
+        self.assertEqual(self.resolve().name, "Invalidated")
+
+    def test_unknown_hostname_is_cached(self):
+        with self.assertRaises(Http404):
+            self.resolve("non-existing.tenant.bg")
+
+        with self.assertNumQueries(0):
+            with self.assertRaises(Http404):
+                self.resolve("non-existing.tenant.bg")
+
+    def test_unknown_hostname_is_forgotten_when_domain_is_created(self):
+        with self.assertRaises(Http404):
+            self.resolve("created-later.tenant.bg")
+
+        with schema_context("public"):
+            Domain.objects.create(
+                domain="created-later.tenant.bg", tenant=self.tenant, is_primary=False
+            )
+
+        self.assertEqual(self.resolve("created-later.tenant.bg").pk, self.tenant.pk)
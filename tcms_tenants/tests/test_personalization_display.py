@@ -1,13 +1,16 @@
-# Copyright (c) 2022-2024 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2022-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
 
 # pylint: disable=too-many-ancestors
 
+from django.test.client import RequestFactory
 from django.urls import reverse
 from django_tenants.utils import schema_context
 
+from tcms_tenants.context_processors import tenant_navbar_processor
+from tcms_tenants.models import Tenant
 from tcms_tenants.tests import LoggedInTestCase
 
 
@@ -63,3 +66,42 @@ class WhenNameAndOrganizationValuesAreNotSet(LoggedInTestCase):
         self.assertNotContains(response, "Demo Instance")
         self.assertNotContains(response, "demonstration")
         self.assertContains(response, self.tenant.schema_name)
+
+
+class NavbarFragmentCache(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.request = RequestFactory().get("/")
+        self.request.tenant = self.tenant
+
+    def test_fragment_is_rendered_only_when_used(self):
+        with self.assertNumQueries(0):
+            context = tenant_navbar_processor(self.request)
+
+        self.assertIn("navbar-brand", str(context["CUSTOMIZED_LOGO_CONTENTS"]))
+
+    def test_fragment_is_cached(self):
+        str(tenant_navbar_processor(self.request)["CUSTOMIZED_LOGO_CONTENTS"])
+
+        with self.assertNumQueries(0):
+            str(tenant_navbar_processor(self.request)["CUSTOMIZED_LOGO_CONTENTS"])
+
+    def test_cache_is_invalidated_when_tenant_changes(self):
+        self.assertNotIn(
+            "Cache invalidated",
+            str(tenant_navbar_processor(self.request)["CUSTOMIZED_LOGO_CONTENTS"]),
+        )
+
+        with schema_context("public"):
+            # a copy b/c self.tenant is shared between test classes
+            tenant = Tenant.objects.get(pk=self.tenant.pk)
+            tenant.organization = "Cache invalidated"
+            tenant.save()
+
+        self.request.tenant = tenant
+
+        self.assertIn(
+            "<span>Cache invalidated</span>",
+            str(tenant_navbar_processor(self.request)["CUSTOMIZED_LOGO_CONTENTS"]),
+        )
@@ -58,7 +58,8 @@ class PubliclyReadableTenantTestCase(LoggedInTestCase):
 
         # self.tester is not authorized
         # and isn't assigned to any tenant groups b/c that's not possible
-        cls.tenant.authorized_users.remove(cls.tester)
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.tenant.authorized_users.remove(cls.tester)
         # public group permissions don't apply here
         tester.user_set.add(cls.tester)
 
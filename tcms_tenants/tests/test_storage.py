@@ -5,15 +5,21 @@
 
 # pylint: disable=too-many-ancestors
 import os
+from io import StringIO
+from mock import patch
 
 from django.db import connection
 from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.core.files.storage import default_storage
 from django.test import override_settings
+from django.urls import reverse
 
 from django_tenants import utils
 
-from tcms_tenants.storage import TenantFileSystemStorage
+from tcms_tenants.models import StorageUsage
+from tcms_tenants.storage import StorageQuotaExceeded, TenantFileSystemStorage, scan
 from tcms_tenants.tests import LoggedInTestCase, UserFactory
 
 
@@ -79,6 +85,31 @@ class TenantFileSystemStorageTestCase(LoggedInTestCase):
             self.assertEqual(fobj.read(), "Hello T2")
 
 
+class MemoizedPathsTestCase(LoggedInTestCase):
+    @override_settings(
+        MEDIA_ROOT="apps_dir/media",
+        MEDIA_URL="/media/",
+        MULTITENANT_RELATIVE_MEDIA_ROOT="%s",
+    )
+    def test_paths_are_memoized_per_schema_and_reset_when_settings_change(self):
+        storage = TenantFileSystemStorage()
+
+        public_location = storage.location
+        with utils.tenant_context(self.tenant):
+            self.assertTrue(storage.location.endswith("apps_dir/media/fast"))
+            self.assertEqual(storage.base_url, "/media/fast/")
+        self.assertEqual(storage.location, public_location)
+        self.assertEqual(storage.base_url, "/media/public/")
+
+        with override_settings(MEDIA_ROOT="other_dir", MEDIA_URL="/other/"):
+            with utils.tenant_context(self.tenant):
+                self.assertTrue(storage.location.endswith("other_dir/fast"))
+                self.assertEqual(storage.base_url, "/other/fast/")
+
+        with utils.tenant_context(self.tenant):
+            self.assertTrue(storage.location.endswith("apps_dir/media/fast"))
+
+
 class DefaultStorageTestCase(TenantFileSystemStorageTestCase):
     """
     Should result in the same behavior confirming that default
@@ -120,6 +151,26 @@ class TenantDeleteTestCase(LoggedInTestCase):
         self.assertFalse(os.path.exists(file_name))
         self.assertFalse(os.path.exists(tenant_storage_dir))
 
+        # and moved into the trash area
+        trash = [
+            entry.name
+            for entry in os.scandir(default_storage.trash_location)
+            if entry.name.startswith("tenant_to_delete.")
+        ]
+        self.assertEqual(len(trash), 1)
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(
+                    default_storage.trash_location, trash[0], "hello_delete.txt"
+                )
+            )
+        )
+
+        call_command("purge_tenant_trash", chunk_size=1, pause=0, verbosity=0)
+        self.assertFalse(
+            os.path.exists(os.path.join(default_storage.trash_location, trash[0]))
+        )
+
     @override_settings(
         MEDIA_ROOT="apps_dir/media",
         MEDIA_URL="/media/",
@@ -136,3 +187,319 @@ class TenantDeleteTestCase(LoggedInTestCase):
 
         # no tenant relative dir, delete doesn't raise
         tenant.delete()
+
+
+@override_settings(
+    MEDIA_ROOT="apps_dir/media",
+    MEDIA_URL="/media/",
+    MULTITENANT_RELATIVE_MEDIA_ROOT="%s",
+)
+class StorageUsageTestCase(LoggedInTestCase):
+    storage = TenantFileSystemStorage()
+
+    def test_usage_is_updated_on_save_and_delete(self):
+        with utils.tenant_context(self.tenant):
+            before = self.storage.usage()
+
+            file_name = self.storage.save("usage.txt", ContentFile("12345"))
+            usage = self.storage.usage()
+            self.assertEqual(usage.bytes, before.bytes + 5)
+            self.assertEqual(usage.files, before.files + 1)
+
+            self.storage.delete(file_name)
+            usage = self.storage.usage()
+            self.assertEqual(usage.bytes, before.bytes)
+            self.assertEqual(usage.files, before.files)
+
+    def test_upload_over_quota_is_rejected(self):
+        with utils.tenant_context(self.tenant):
+            usage = self.storage.usage()
+            usage.quota = usage.bytes + 3
+            usage.save()
+
+            with self.assertRaisesRegex(StorageQuotaExceeded, "Storage quota exceeded"):
+                self.storage.save("over_quota.txt", ContentFile("12345"))
+
+            self.assertFalse(self.storage.exists("over_quota.txt"))
+            self.assertEqual(self.storage.usage().bytes, usage.bytes)
+
+            file_name = self.storage.save("under_quota.txt", ContentFile("123"))
+            self.storage.delete(file_name)
+
+    @override_settings(KIWI_TENANTS_STORAGE_QUOTA=3)
+    def test_default_quota_applies_without_explicit_one(self):
+        with utils.tenant_context(self.tenant):
+            StorageUsage.objects.filter(tenant=self.tenant).update(
+                bytes=0, files=0, quota=None
+            )
+
+            with self.assertRaises(StorageQuotaExceeded):
+                self.storage.save("over_default_quota.txt", ContentFile("12345"))
+
+            file_name = self.storage.save("under_default_quota.txt", ContentFile("123"))
+            self.storage.delete(file_name)
+
+    def test_usage_without_record_isnt_tracked_until_reconciled(self):
+        StorageUsage.objects.filter(tenant=self.tenant).delete()
+
+        with utils.tenant_context(self.tenant):
+            self.assertIsNone(self.storage.usage())
+
+            # doesn't scan the disk on the request path
+            with patch("tcms_tenants.storage.scan", side_effect=AssertionError):
+                file_name = self.storage.save("untracked.txt", ContentFile("123456"))
+            self.assertIsNone(self.storage.usage())
+
+        call_command("reconcile_storage_usage", verbosity=0)
+
+        with utils.tenant_context(self.tenant):
+            usage = self.storage.usage()
+            self.assertEqual((usage.bytes, usage.files), scan(self.storage.location))
+            self.assertGreaterEqual(usage.bytes, 6)
+
+            self.storage.delete(file_name)
+
+    def test_reconcile_recalculates_usage_from_disk(self):
+        with utils.tenant_context(self.tenant):
+            file_name = self.storage.save("reconcile.txt", ContentFile("1234567"))
+            expected = scan(self.storage.location)
+
+            StorageUsage.objects.filter(tenant=self.tenant).update(bytes=0, files=0)
+
+        call_command("reconcile_storage_usage", verbosity=0)
+
+        usage = StorageUsage.objects.get(tenant=self.tenant)
+        self.assertEqual((usage.bytes, usage.files), expected)
+        self.assertGreaterEqual(usage.bytes, 7)
+
+        with utils.tenant_context(self.tenant):
+            self.storage.delete(file_name)
+
+
+@override_settings(
+    MEDIA_ROOT="apps_dir/media",
+    MEDIA_URL="/media/",
+    MULTITENANT_RELATIVE_MEDIA_ROOT="%s",
+    KIWI_TENANTS_DEDUP_STORAGE=True,
+)
+class DeduplicatedStorageTestCase(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        # b/c .deduplicate is a cached property
+        self.storage = TenantFileSystemStorage()
+
+    def test_same_content_is_stored_once(self):
+        content = "Deduplicated content"
+
+        public_name = self.storage.save("dedup.txt", ContentFile(content))
+        public_path = self.storage.path(public_name)
+        public_url = self.storage.url(public_name)
+
+        with utils.tenant_context(self.tenant):
+            tenant_name = self.storage.save("dedup.txt", ContentFile(content))
+            tenant_path = self.storage.path(tenant_name)
+            tenant_url = self.storage.url(tenant_name)
+
+        blob = self.storage.blob_path(self.storage.file_digest(public_path))
+
+        # paths & URLs are still isolated per tenant
+        self.assertNotEqual(public_path, tenant_path)
+        self.assertTrue(public_url.startswith("/media/public/"))
+        self.assertTrue(tenant_url.startswith("/media/fast/"))
+
+        # but point to the same blob
+        self.assertTrue(os.path.samefile(public_path, blob))
+        self.assertTrue(os.path.samefile(tenant_path, blob))
+        self.assertEqual(os.stat(blob).st_nlink, 3)
+
+        # other references are not affected by delete
+        self.storage.delete(public_name)
+        self.assertFalse(os.path.exists(public_path))
+        self.assertTrue(os.path.exists(blob))
+        with open(tenant_path, "r", encoding="utf-8") as fobj:
+            self.assertEqual(fobj.read(), content)
+
+        # blob is removed together with the last reference
+        with utils.tenant_context(self.tenant):
+            self.storage.delete(tenant_name)
+        self.assertFalse(os.path.exists(tenant_path))
+        self.assertFalse(os.path.exists(blob))
+
+    def test_delete_doesnt_hash_file_contents(self):
+        name = self.storage.save("not-rehashed.txt", ContentFile("Not re-hashed"))
+        path = self.storage.path(name)
+        digest = self.storage.file_digest(path)
+        blob = self.storage.blob_path(digest)
+
+        self.assertEqual(self.storage.stored_digest(path), digest)
+
+        with patch.object(
+            TenantFileSystemStorage, "file_digest", side_effect=AssertionError
+        ):
+            self.storage.delete(name)
+
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(blob))
+
+    def test_unreferenced_blobs_are_collected(self):
+        name = self.storage.save("collected.txt", ContentFile("Collected content"))
+        path = self.storage.path(name)
+        blob = self.storage.blob_path(self.storage.file_digest(path))
+
+        # the same as what delete_recursively() does
+        os.unlink(path)
+        self.assertEqual(os.stat(blob).st_nlink, 1)
+
+        call_command("collect_tenant_blobs", min_age=0, verbosity=0)
+        self.assertFalse(os.path.exists(blob))
+
+
+@override_settings(
+    MEDIA_ROOT="apps_dir/media",
+    MEDIA_URL="/media/",
+    MULTITENANT_RELATIVE_MEDIA_ROOT="%s",
+    KIWI_TENANTS_STORAGE_SHARD_LEVELS=2,
+)
+class ShardedStorageTestCase(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+        # b/c .shard_levels is a cached property
+        self.storage = TenantFileSystemStorage()
+
+    def test_new_files_are_saved_in_fan_out_layout(self):
+        with utils.tenant_context(self.tenant):
+            name = self.storage.save("attachments/sharded.txt", ContentFile("Sharded"))
+            path = self.storage.path(name)
+
+            self.assertEqual(
+                path,
+                os.path.join(self.storage.location, self.storage.sharded_name(name)),
+            )
+            self.assertRegex(
+                os.path.relpath(path, self.storage.location),
+                r"^[0-9a-f]{2}/[0-9a-f]{2}/attachments/sharded.*\.txt$",
+            )
+            # files are served via the view b/c MEDIA_URL doesn't know about shards
+            url = self.storage.url(name)
+            self.assertEqual(url, reverse("tcms_tenants:serve-media", args=[name]))
+            self.assertTrue(self.storage.exists(name))
+
+            self.assertIn(
+                os.path.basename(name), self.storage.listdir("attachments")[1]
+            )
+            directories, _files = self.storage.listdir("")
+            self.assertIn("attachments", directories)
+            for directory in directories:
+                self.assertNotRegex(directory, r"^[0-9a-f]{2}$")
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"Sharded")
+
+        with utils.tenant_context(self.tenant):
+            self.storage.delete(name)
+            self.assertFalse(os.path.exists(path))
+
+    def test_old_files_are_found_and_moved_by_command(self):
+        with utils.tenant_context(self.tenant):
+            name = "attachments/legacy.txt"
+            legacy_path = os.path.join(self.storage.location, name)
+            os.makedirs(os.path.dirname(legacy_path), exist_ok=True)
+            with open(legacy_path, "w", encoding="utf-8") as fobj:
+                fobj.write("Legacy")
+
+            # compatibility lookup
+            self.assertEqual(self.storage.path(name), legacy_path)
+            self.assertTrue(self.storage.exists(name))
+
+        for _attempt in range(2):
+            call_command(
+                "shard_tenant_media",
+                schema_names=[self.tenant.schema_name],
+                verbosity=0,
+            )
+
+        with utils.tenant_context(self.tenant):
+            sharded_path = self.storage.path(name)
+            self.assertNotEqual(sharded_path, legacy_path)
+            self.assertFalse(os.path.exists(legacy_path))
+
+            with self.storage.open(name) as fobj:
+                self.assertEqual(fobj.read(), b"Legacy")
+
+            # still listed after being moved into the fan-out layout
+            self.assertIn("legacy.txt", self.storage.listdir("attachments")[1])
+
+            self.storage.delete(name)
+
+
+@override_settings(
+    MEDIA_ROOT="apps_dir/media",
+    MEDIA_URL="/media/",
+    MULTITENANT_RELATIVE_MEDIA_ROOT="tenants/%s",
+)
+class FindOrphanedMediaTestCase(LoggedInTestCase):
+    @staticmethod
+    def _write(path, content, age=0):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as fobj:
+            fobj.write(content)
+
+        if age:
+            timestamp = os.stat(path).st_mtime - age
+            os.utime(path, (timestamp, timestamp))
+
+    def test_orphaned_directories_and_files_are_reported_and_reclaimed(self):
+        orphaned_dir = default_storage.location_for("deleted_tenant")
+        self._write(os.path.join(orphaned_dir, "left_behind.txt"), "12345")
+
+        unreferenced = os.path.join(
+            default_storage.location_for(self.tenant.schema_name), "unreferenced.txt"
+        )
+        self._write(unreferenced, "1234567", age=7200)
+
+        # too new to be considered
+        recent = os.path.join(
+            default_storage.location_for(self.tenant.schema_name), "recent.txt"
+        )
+        self._write(recent, "123")
+
+        output = StringIO()
+        call_command("find_orphaned_media", min_age=3600, stdout=output)
+        output = output.getvalue()
+
+        self.assertIn(
+            f"Orphaned directory '{orphaned_dir}': 5 bytes in 1 files", output
+        )
+        self.assertIn(
+            f"Unreferenced file 'unreferenced.txt' on tenant '{self.tenant.schema_name}'",
+            output,
+        )
+        self.assertNotIn("recent.txt", output)
+        self.assertTrue(os.path.exists(orphaned_dir))
+        self.assertTrue(os.path.exists(unreferenced))
+
+        call_command(
+            "find_orphaned_media", min_age=3600, reclaim=True, stdout=StringIO()
+        )
+        self.assertFalse(os.path.exists(orphaned_dir))
+        self.assertFalse(os.path.exists(unreferenced))
+        self.assertTrue(os.path.exists(recent))
+
+        os.unlink(recent)
+
+    @override_settings(MULTITENANT_RELATIVE_MEDIA_ROOT="%s")
+    def test_refuses_to_run_when_tenants_are_stored_directly_in_media_root(self):
+        not_a_tenant = os.path.join(
+            os.path.abspath(default_storage.base_location), "not_a_tenant"
+        )
+        self._write(os.path.join(not_a_tenant, "keep.txt"), "keep", age=7200)
+
+        with self.assertRaisesRegex(CommandError, "sub-directory of MEDIA_ROOT"):
+            call_command(
+                "find_orphaned_media", min_age=3600, reclaim=True, stdout=StringIO()
+            )
+
+        self.assertTrue(os.path.exists(not_a_tenant))
+        os.unlink(os.path.join(not_a_tenant, "keep.txt"))
+        os.rmdir(not_a_tenant)
@@ -5,14 +5,22 @@
 
 # pylint: disable=too-many-ancestors
 
+from mock import patch
+
 from django.contrib.auth import get_user_model
-from django.test import override_settings
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django_tenants import utils as django_tenant_utils
 
 from tcms.tests import deny_certain_email_addresses
 
 from tcms_tenants import utils
-from tcms_tenants.tests import LoggedInTestCase
+from tcms_tenants.models import OutboxEmail
+from tcms_tenants.tests import LoggedInTestCase, TenantGroupsTestCase, UserFactory
 
 
 class TenantDomainTestCase(LoggedInTestCase):
@@ -41,6 +49,36 @@ class TenantDomainTestCase(LoggedInTestCase):
             result = utils.tenant_domain("public")
             self.assertEqual(result, "public.qa.kiwitcms.org")
 
+    def test_bulk_resolution_uses_a_single_query(self):
+        with override_settings(KIWI_TENANTS_DOMAIN="qa.kiwitcms.org"):
+            with self.assertNumQueries(1):
+                result = utils.tenant_domains(
+                    [self.tenant.schema_name, self.tenant2.schema_name, "public"]
+                )
+
+            self.assertEqual(result[self.tenant2.schema_name], "other2.example.com")
+            self.assertEqual(result["public"], "public.qa.kiwitcms.org")
+
+            # memoized
+            with self.assertNumQueries(0):
+                self.assertEqual(
+                    utils.tenant_domain(self.tenant2.schema_name), "other2.example.com"
+                )
+
+    def test_memoized_value_is_invalidated_when_domain_changes(self):
+        self.assertEqual(
+            utils.tenant_domain(self.tenant2.schema_name), "other2.example.com"
+        )
+
+        with utils.schema_context("public"):
+            self.domain2.is_primary = False
+            self.domain2.save()
+
+        with override_settings(KIWI_TENANTS_DOMAIN="qa.kiwitcms.org"):
+            self.assertEqual(
+                utils.tenant_domain(self.tenant2.schema_name), "other2.qa.kiwitcms.org"
+            )
+
 
 class CreateUserAccountTestCase(LoggedInTestCase):
     def test_should_throw_validation_error_when_used_with_blacklisted_email_address(
@@ -80,3 +118,260 @@ class CreateUserAccountTestCase(LoggedInTestCase):
         self.assertTrue(
             get_user_model().objects.filter(username="anonymoususer.2").exists()
         )
+
+
+class InviteUsersTestCase(TenantGroupsTestCase):
+    def _invite(self, email_addresses):
+        request = RequestFactory().get("/")
+        request.tenant = self.tenant
+        request.user = self.tester
+
+        with CaptureQueriesContext(connection) as context:
+            result = utils.invite_users(
+                request, email_addresses, notify_via_email=False
+            )
+
+        return result, len(context.captured_queries)
+
+    def test_number_of_queries_doesnt_depend_on_number_of_addresses(self):
+        _result, few = self._invite([f"few-{i}@example.com" for i in range(2)])
+        _result, many = self._invite([f"many-{i}@example.com" for i in range(50)])
+
+        self.assertEqual(few, many)
+        self.assertEqual(
+            52,
+            self.tenant.authorized_users.filter(email__endswith="@example.com").count(),
+        )
+
+    def test_reports_status_for_each_address(self):
+        result, _queries = self._invite(
+            [self.tester.email, "New-Account@Example.com", self.tenant.owner.email]
+        )
+
+        self.assertEqual(
+            result,
+            {
+                self.tester.email: "already-authorized",
+                "new-account@example.com": "created-account",
+                self.tenant.owner.email: "already-authorized",
+            },
+        )
+
+    def test_invites_existing_users(self):
+        user = UserFactory()
+        result, _queries = self._invite([user.email])
+
+        self.assertEqual(result, {user.email: "invited"})
+        self.assertTrue(self.tenant.authorized_users.filter(pk=user.pk).exists())
+
+    def test_new_accounts_get_different_passwords(self):
+        self._invite(["pwd-1@example.com", "pwd-2@example.com"])
+
+        users = get_user_model().objects.filter(email__startswith="pwd-")
+        self.assertEqual(len({user.password for user in users}), 2)
+        for user in users:
+            # b/c they need to be able to reset it
+            self.assertTrue(user.has_usable_password())
+
+    def test_usernames_dont_collide_with_existing_ones(self):
+        UserFactory(username="Collide")
+        UserFactory(username="collide.1")
+        UserFactory(username="collide.5x")
+
+        self._invite(["collide@example.com", "collide@example.org"])
+
+        self.assertEqual(
+            sorted(
+                get_user_model()
+                .objects.filter(email__startswith="collide@")
+                .values_list("username", flat=True)
+            ),
+            ["collide.2", "collide.3"],
+        )
+
+    def test_suffixes_are_looked_up_only_on_collision(self):
+        with CaptureQueriesContext(connection) as queries:
+            self._invite(["no-collision@example.com"])
+
+        self.assertFalse(
+            [query for query in queries if "regexp_replace" in query["sql"]]
+        )
+        self.assertTrue(
+            get_user_model().objects.filter(username="no-collision").exists()
+        )
+
+
+class IterEmailAddressesTestCase(LoggedInTestCase):
+    @staticmethod
+    def _parse(name, content):
+        return list(
+            utils.iter_email_addresses(
+                SimpleUploadedFile(name, content.encode("utf-8"))
+            )
+        )
+
+    def test_csv_with_header(self):
+        self.assertEqual(
+            self._parse(
+                "users.csv",
+                "\ufeffName,Email\r\nAlice, alice@example.com\r\n\r\nBob\r\n",
+            ),
+            ["alice@example.com", ""],
+        )
+
+    def test_csv_without_header(self):
+        self.assertEqual(
+            self._parse("users.csv", "alice@example.com\nbob@example.com,Bob\n"),
+            ["alice@example.com", "bob@example.com"],
+        )
+
+    def test_json_lines(self):
+        self.assertEqual(
+            self._parse(
+                "users.jsonl",
+                '{"email": "alice@example.com"}\n\n"bob@example.com"\n{broken\n',
+            ),
+            ["alice@example.com", "bob@example.com", "{broken"],
+        )
+
+
+@override_settings(KIWI_TENANTS_EMAIL_OUTBOX=True)
+class EmailOutboxTestCase(LoggedInTestCase):
+    def _queue(self, recipients):
+        utils.send_emails(
+            template_name="tcms_tenants/email/new.txt",
+            recipients=recipients,
+            subject="Outbox test",
+            context={"tenant_url": "https://outbox.example.com"},
+        )
+
+    @patch("tcms.core.utils.mailto.send_mail")
+    def test_messages_are_queued_instead_of_sent(self, send_mail):
+        self._queue(["first@example.com", "second@example.com"])
+
+        self.assertFalse(send_mail.called)
+        self.assertEqual(
+            2, OutboxEmail.objects.filter(status=OutboxEmail.PENDING).count()
+        )
+
+    def test_drainer_sends_pending_messages(self):
+        self._queue(["first@example.com", "second@example.com"])
+        mail.outbox = []
+
+        call_command("send_tenant_emails", verbosity=0)
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ["first@example.com", "second@example.com"],
+        )
+        self.assertIn("https://outbox.example.com", mail.outbox[0].body)
+        self.assertEqual(2, OutboxEmail.objects.filter(status=OutboxEmail.SENT).count())
+
+    @override_settings(KIWI_TENANTS_EMAIL_RETRY_DELAY=60)
+    def test_failed_messages_are_retried_later(self):
+        self._queue(["retry@example.com"])
+
+        with patch("django.core.mail.EmailMessage.send", side_effect=OSError("Boom")):
+            call_command("send_tenant_emails", verbosity=0)
+
+        email = OutboxEmail.objects.get(recipients=["retry@example.com"])
+        self.assertEqual(email.status, OutboxEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.error, "Boom")
+        self.assertGreater(email.next_attempt_on, email.created_on)
+
+        # not ready to be sent yet
+        mail.outbox = []
+        call_command("send_tenant_emails", verbosity=0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_message_is_marked_as_failed_after_max_attempts(self):
+        self._queue(["failed@example.com"])
+
+        with patch("django.core.mail.EmailMessage.send", side_effect=OSError("Boom")):
+            call_command("send_tenant_emails", verbosity=0, max_attempts=1)
+
+        email = OutboxEmail.objects.get(recipients=["failed@example.com"])
+        self.assertEqual(email.status, OutboxEmail.FAILED)
+
+
+class AuthorizationCacheTestCase(LoggedInTestCase):
+    def test_repeated_checks_dont_query_the_database(self):
+        self.assertTrue(utils.can_access(self.tester, self.tenant))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(utils.can_access(self.tester, self.tenant))
+            self.assertTrue(utils.owns_tenant(self.tester, self.tenant))
+
+    def test_checks_are_memoized_per_request(self):
+        request = RequestFactory().get("/")
+        request.user = self.tester
+        request.tenant = self.tenant
+
+        with patch(
+            "tcms_tenants.utils.is_authorized", wraps=utils.is_authorized
+        ) as is_authorized:
+            for _ in range(5):
+                self.assertTrue(utils.request_owns_tenant(request))
+                self.assertTrue(utils.request_can_access(request))
+
+            # owns_tenant() & can_access() once each
+            self.assertEqual(is_authorized.call_count, 2)
+
+            # a new request checks again
+            request = RequestFactory().get("/")
+            request.user = self.tester
+            request.tenant = self.tenant
+            self.assertTrue(utils.request_owns_tenant(request))
+            self.assertEqual(is_authorized.call_count, 3)
+
+    def test_cache_is_invalidated_when_user_is_removed(self):
+        self.assertTrue(utils.can_access(self.tester, self.tenant))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tenant.authorized_users.remove(self.tester)
+        self.assertFalse(utils.can_access(self.tester, self.tenant))
+
+    def test_cache_is_invalidated_when_user_is_added(self):
+        new_user = UserFactory()
+        self.assertFalse(utils.can_access(new_user, self.tenant))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tenant.authorized_users.add(new_user)
+        self.assertTrue(utils.can_access(new_user, self.tenant))
+
+    def test_cache_is_invalidated_when_relation_is_cleared_from_user_side(self):
+        self.assertTrue(utils.can_access(self.tester, self.tenant))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tester.tenant_set.clear()
+        self.assertFalse(utils.can_access(self.tester, self.tenant))
+
+    def test_cache_is_invalidated_when_relation_is_cleared_from_tenant_side(self):
+        self.assertTrue(utils.can_access(self.tester, self.tenant))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tenant.authorized_users.clear()
+        self.assertFalse(utils.can_access(self.tester, self.tenant))
+
+    def test_cache_is_invalidated_when_through_model_is_deleted(self):
+        self.assertTrue(utils.can_access(self.tester, self.tenant))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tenant.authorized_users.through.objects.filter(
+                tenant=self.tenant, user=self.tester
+            ).delete()
+        self.assertFalse(utils.can_access(self.tester, self.tenant))
+
+    def test_cache_is_invalidated_only_after_commit(self):
+        self.assertTrue(utils.can_access(self.tester, self.tenant))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.tenant.authorized_users.remove(self.tester)
+            # not invalidated until the transaction is committed
+            self.assertTrue(utils.can_access(self.tester, self.tenant))
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(utils.can_access(self.tester, self.tenant))
@@ -1,10 +1,11 @@
-# Copyright (c) 2019-2025 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2019-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
 
 # pylint: disable=too-many-ancestors
 from datetime import timedelta
+from urllib.parse import quote
 from mock import patch
 
 from django.urls import reverse
@@ -12,17 +13,20 @@ from django.utils import timezone
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
 from django.http import HttpResponseRedirect
 from django.test import override_settings
 from django.utils.translation import gettext_lazy as _
 
-from django_tenants.utils import tenant_context
+from django_tenants.utils import schema_exists, tenant_context
 
 from tcms.tests import deny_certain_email_addresses
 
-from tcms_tenants.models import Tenant
+from tcms_tenants.models import PooledSchema, ProvisioningJob, Tenant
 from tcms_tenants.forms import VALIDATION_RE
-from tcms_tenants.tests import LoggedInTestCase, TenantGroupsTestCase
+from tcms_tenants.tests import LoggedInTestCase, TenantGroupsTestCase, UserFactory
 from tcms_tenants.oss_utils import create_oss_tenant
 
 from tenant_groups.models import Group as TenantGroup
@@ -193,6 +197,189 @@ class NewTenantViewTestCase(TenantGroupsTestCase):
             )
             self.assertTrue(tenant.owner.tenant_groups.filter(name="Tester").exists())
 
+    @patch("tcms.core.utils.mailto.send_mail")
+    def test_create_tenant_claims_schema_from_pool(self, send_mail):
+        call_command("refill_tenant_pool", "--size", "1", verbosity=0)
+        pooled = PooledSchema.objects.get()
+        self.assertTrue(schema_exists(pooled.schema_name))
+
+        response = self.client.post(
+            reverse("tcms_tenants:create-tenant"),
+            {
+                "name": "From the pool",
+                "schema_name": "frompool",
+                "owner": self.tester.pk,
+                "publicly_readable": False,
+                "paid_until": "",
+            },
+        )
+
+        self.assertIsInstance(response, HttpResponseRedirect)
+        self.assertEqual(
+            response["Location"], f"https://frompool.{settings.KIWI_TENANTS_DOMAIN}"
+        )
+
+        # pooled schema was renamed
+        self.assertFalse(PooledSchema.objects.exists())
+        self.assertFalse(schema_exists(pooled.schema_name))
+        self.assertTrue(schema_exists("frompool"))
+
+        tenant = Tenant.objects.get(schema_name="frompool")
+        self.assertEqual(tenant.name, "From the pool")
+        self.assertIsNone(tenant.paid_until)
+        self.assertTrue(tenant.authorized_users.filter(pk=self.tester.pk).exists())
+
+        with tenant_context(tenant):
+            self.assertTrue(
+                tenant.owner.tenant_groups.filter(name="Administrator").exists()
+            )
+            self.assertTrue(tenant.owner.tenant_groups.filter(name="Tester").exists())
+
+        self.assertEqual(send_mail.call_count, 1)
+
+    @override_settings(KIWI_TENANTS_ASYNC_CREATE=True)
+    @patch("tcms.core.utils.mailto.send_mail")
+    def test_create_tenant_in_asynchronous_mode(self, send_mail):
+        response = self.client.post(
+            reverse("tcms_tenants:create-tenant"),
+            {
+                "name": "Created later",
+                "schema_name": "later",
+                "owner": self.tester.pk,
+                "publicly_readable": False,
+                "paid_until": "",
+            },
+        )
+
+        job = ProvisioningJob.objects.get(schema_name="later")
+        self.assertEqual(job.status, ProvisioningJob.PENDING)
+        self.assertEqual(job.owner, self.tester)
+        self.assertFalse(Tenant.objects.filter(schema_name="later").exists())
+        self.assertRedirects(
+            response,
+            reverse("tcms_tenants:create-status", args=[job.pk]),
+            fetch_redirect_response=False,
+        )
+
+        response = self.client.get(reverse("tcms_tenants:create-status", args=[job.pk]))
+        self.assertContains(response, _("Pending"))
+        self.assertContains(response, 'http-equiv="refresh"')
+
+        call_command("process_tenant_jobs", verbosity=0)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProvisioningJob.DONE)
+        self.assertEqual(job.tenant.schema_name, "later")
+        self.assertEqual(job.tenant.owner, self.tester)
+        self.assertEqual(send_mail.call_count, 1)
+
+        with tenant_context(job.tenant):
+            self.assertTrue(
+                self.tester.tenant_groups.filter(name="Administrator").exists()
+            )
+
+        response = self.client.get(reverse("tcms_tenants:create-status", args=[job.pk]))
+        self.assertIsInstance(response, HttpResponseRedirect)
+        self.assertEqual(
+            response["Location"], f"https://later.{settings.KIWI_TENANTS_DOMAIN}"
+        )
+
+    def test_invalid_provisioning_job_is_marked_as_failed(self):
+        job = ProvisioningJob.objects.create(
+            schema_name=self.tenant.schema_name,
+            data={"name": "Duplicate", "schema_name": self.tenant.schema_name},
+            owner=self.tester,
+        )
+
+        call_command("process_tenant_jobs", verbosity=0)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProvisioningJob.FAILED)
+        self.assertIn("Schema name already in use", job.error)
+
+        response = self.client.get(reverse("tcms_tenants:create-status", args=[job.pk]))
+        self.assertContains(response, _("Failed"))
+        self.assertNotContains(response, 'http-equiv="refresh"')
+
+    def test_stale_running_job_is_picked_up_again(self):
+        stale = ProvisioningJob.objects.create(
+            schema_name="Stale_Invalid",
+            data={"name": "Stale", "schema_name": "Stale_Invalid"},
+            owner=self.tester,
+            status=ProvisioningJob.RUNNING,
+        )
+        ProvisioningJob.objects.filter(pk=stale.pk).update(
+            updated_on=timezone.now() - timedelta(hours=2)
+        )
+        running = ProvisioningJob.objects.create(
+            schema_name="stillrunning",
+            data={"name": "Still running", "schema_name": "stillrunning"},
+            owner=self.tester,
+            status=ProvisioningJob.RUNNING,
+        )
+
+        call_command("process_tenant_jobs", verbosity=0, stale_after=3600)
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, ProvisioningJob.FAILED)
+        running.refresh_from_db()
+        self.assertEqual(running.status, ProvisioningJob.RUNNING)
+
+    def test_stale_job_whose_tenant_was_created_is_done(self):
+        stale = ProvisioningJob.objects.create(
+            schema_name=self.tenant.schema_name,
+            data={"name": "Crashed", "schema_name": self.tenant.schema_name},
+            owner=self.tester,
+            status=ProvisioningJob.RUNNING,
+        )
+        ProvisioningJob.objects.filter(pk=stale.pk).update(
+            updated_on=timezone.now() - timedelta(hours=2)
+        )
+
+        call_command("process_tenant_jobs", verbosity=0, stale_after=3600)
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, ProvisioningJob.DONE)
+        self.assertEqual(stale.tenant, self.tenant)
+        self.assertEqual(stale.error, "")
+
+    def test_status_of_job_for_deleted_tenant(self):
+        job = ProvisioningJob.objects.create(
+            schema_name="deleted",
+            data={"name": "Deleted", "schema_name": "deleted"},
+            owner=self.tester,
+            status=ProvisioningJob.DONE,
+            tenant=None,
+        )
+
+        response = self.client.get(reverse("tcms_tenants:create-status", args=[job.pk]))
+        self.assertContains(response, _("This tenant has been deleted!"))
+        self.assertNotContains(response, 'http-equiv="refresh"')
+
+    @override_settings(KIWI_TENANTS_ASYNC_CREATE=True)
+    def test_schema_name_of_queued_job_is_reserved(self):
+        ProvisioningJob.objects.create(
+            schema_name="reserved",
+            data={"name": "Reserved", "schema_name": "reserved"},
+            owner=self.tenant.owner,
+        )
+
+        response = self.client.post(
+            reverse("tcms_tenants:create-tenant"),
+            {
+                "name": "Also reserved",
+                "schema_name": "reserved",
+                "owner": self.tester.pk,
+                "publicly_readable": False,
+                "paid_until": "",
+            },
+        )
+
+        self.assertContains(response, _("Schema name already in use"))
+        self.assertEqual(
+            ProvisioningJob.objects.filter(schema_name="reserved").count(), 1
+        )
+
     @patch("tcms.core.utils.mailto.send_mail")
     def test_create_oss_tenant_with_helper_function(self, send_mail):
         tenant = create_oss_tenant(
@@ -398,3 +585,107 @@ class UpdateTenantViewTestCase(LoggedInTestCase):
 
         self.tenant.refresh_from_db()
         self.assertFalse(self.tenant.publicly_readable)
+
+
+@override_settings(
+    MEDIA_ROOT="apps_dir/media",
+    MULTITENANT_RELATIVE_MEDIA_ROOT="%s",
+    KIWI_TENANTS_MEDIA_SENDFILE="X-Accel-Redirect",
+    KIWI_TENANTS_MEDIA_ACCEL_PREFIX="/private-media/",
+)
+class ServeMediaTestCase(LoggedInTestCase):
+    def setUp(self):
+        super().setUp()
+
+        with tenant_context(self.tenant):
+            self.file_name = default_storage.save(
+                "served.txt", ContentFile("Served via nginx")
+            )
+
+    def tearDown(self):
+        with tenant_context(self.tenant):
+            default_storage.delete(self.file_name)
+
+        super().tearDown()
+
+    def test_authorized_user_gets_x_accel_redirect(self):
+        response = self.client.get(
+            reverse("tcms_tenants:serve-media", args=[self.file_name])
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.headers["X-Accel-Redirect"],
+            f"/private-media/fast/{self.file_name}",
+        )
+        self.assertEqual(response.headers["Content-Type"], "text/plain")
+        self.assertEqual(response.content, b"")
+
+    @override_settings(KIWI_TENANTS_MEDIA_SENDFILE="X-Sendfile")
+    def test_authorized_user_gets_x_sendfile(self):
+        response = self.client.get(
+            reverse("tcms_tenants:serve-media", args=[self.file_name])
+        )
+
+        self.assertEqual(response.status_code, 200)
+        with tenant_context(self.tenant):
+            self.assertEqual(
+                response.headers["X-Sendfile"],
+                quote(default_storage.path(self.file_name)),
+            )
+
+    @override_settings(KIWI_TENANTS_MEDIA_SENDFILE="X-Sendfile")
+    def test_x_sendfile_with_non_ascii_file_name(self):
+        with tenant_context(self.tenant):
+            file_name = default_storage.save("файл.txt", ContentFile("Кирилица"))
+            full_path = default_storage.path(file_name)
+
+        response = self.client.get(
+            reverse("tcms_tenants:serve-media", args=[file_name])
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Sendfile"], quote(full_path))
+        self.assertTrue(response.headers["X-Sendfile"].isascii())
+
+        with tenant_context(self.tenant):
+            default_storage.delete(file_name)
+
+    def test_storage_urls_point_to_the_view(self):
+        with tenant_context(self.tenant):
+            self.assertEqual(
+                default_storage.url(self.file_name),
+                reverse("tcms_tenants:serve-media", args=[self.file_name]),
+            )
+
+    def test_anonymous_user_is_redirected_to_login(self):
+        self.client.logout()
+        response = self.client.get(
+            reverse("tcms_tenants:serve-media", args=[self.file_name])
+        )
+
+        self.assertIsInstance(response, HttpResponseRedirect)
+        self.assertNotIn("X-Accel-Redirect", response.headers)
+
+    def test_unauthorized_user_is_denied(self):
+        user = UserFactory()
+        user.set_password("password")
+        user.save()
+        self.client.login(
+            username=user.username,  # nosec:B106:hardcoded_password_funcarg
+            password="password",
+        )
+
+        response = self.client.get(
+            reverse("tcms_tenants:serve-media", args=[self.file_name])
+        )
+
+        self.assertNotEqual(response.status_code, 200)
+        self.assertNotIn("X-Accel-Redirect", response.headers)
+
+    def test_directory_traversal_is_not_found(self):
+        response = self.client.get(
+            reverse("tcms_tenants:serve-media", args=["../public/served.txt"])
+        )
+
+        self.assertEqual(response.status_code, 404)
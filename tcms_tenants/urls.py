@@ -1,4 +1,4 @@
-# Copyright (c) 2019-2021 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2019-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
@@ -10,8 +10,14 @@ app_name = "tcms_tenants"
 
 urlpatterns = [
     re_path(r"^create/$", views.NewTenantView.as_view(), name="create-tenant"),
+    re_path(
+        r"^create/(?P<pk>\d+)/$",
+        views.ProvisioningStatusView.as_view(),
+        name="create-status",
+    ),
     re_path(r"^edit/$", views.UpdateTenantView.as_view(), name="edit-tenant"),
     re_path(r"^invite/$", views.InviteUsers.as_view(), name="invite-users"),
+    re_path(r"^media/(?P<path>.+)$", views.ServeMedia.as_view(), name="serve-media"),
     re_path(
         r"^go/to/(?P<tenant>\w+)/(?P<path>.*)$",
         views.RedirectTo.as_view(),
@@ -3,18 +3,34 @@
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
 
+import codecs
+import csv
 import datetime
+import itertools
+import json
+import threading
+import time
 import uuid
+from collections import OrderedDict
 
+from django import forms
 from django.conf import settings
-from django.db import connections
+from django.core.cache import cache
+from django.db import connections, transaction
 from django.contrib import messages
 from django.contrib.sites.models import Site
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher, make_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.core.exceptions import ValidationError
 from django.core.management import call_command
+from django.db.models import Func, Value
+from django.db.models.functions import Lower
+from django.template.loader import render_to_string
 from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
+from django.utils.translation import override
 from django.contrib.contenttypes.models import ContentType
 
 from django_tenants.utils import (
@@ -24,14 +40,91 @@ from django_tenants.utils import (
     tenant_context,
 )
 from tcms.kiwi_auth import forms as kiwi_auth_forms
-from tcms.core.utils.mailto import mailto
+from tcms.core.utils.mailto import custom_email_validators, mailto
+from tcms.utils.permissions import assign_default_group_permissions
 
-from tcms_tenants.models import Domain, Tenant
+from tcms_tenants.models import Domain, OutboxEmail, PooledSchema, Tenant
 from tenant_groups.models import Group as TenantGroup
+from tenant_groups.utils import bump_permissions_version
 
 UserModel = get_user_model()
 
 
+class TenantCache:
+    """
+    In-process, size-bounded LRU cache with TTL. Used for hostname -> Tenant
+    and schema_name -> domain mappings. Unknown keys are cached as well, via
+    ``NOT_FOUND``, in order to avoid hitting the database for non-existing
+    tenants!
+
+    Entries are invalidated by the handlers in ``tcms_tenants.handlers``
+    however these work only for the current process. Other processes will
+    see changes after ``KIWI_TENANTS_HOST_CACHE_TTL`` seconds, or after
+    ``KIWI_TENANTS_HOST_NOT_FOUND_TTL`` seconds for new tenants!
+    """
+
+    NOT_FOUND = object()
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached value, ``NOT_FOUND`` or ``None`` if nothing is cached!
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if value is self.NOT_FOUND:
+            # short b/c tenants created by other processes must show up quickly
+            ttl = getattr(settings, "KIWI_TENANTS_HOST_NOT_FOUND_TTL", 2)
+        else:
+            ttl = getattr(settings, "KIWI_TENANTS_HOST_CACHE_TTL", 60)
+        max_size = getattr(settings, "KIWI_TENANTS_HOST_CACHE_SIZE", 1024)
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None, tenant_pk=None):
+        with self._lock:
+            self._entries.pop(key, None)
+
+            if tenant_pk is not None:
+                for cached_key, (_expires_at, value) in list(self._entries.items()):
+                    if getattr(value, "pk", None) == tenant_pk:
+                        del self._entries[cached_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def clear_not_found(self):
+        with self._lock:
+            for cached_key, (_expires_at, value) in list(self._entries.items()):
+                if value is self.NOT_FOUND:
+                    del self._entries[cached_key]
+
+
+# schema_name -> primary domain
+domain_cache = TenantCache()
+
+
 def get_current_tenant():
     return connections[get_tenant_database_alias()].tenant
 
@@ -50,13 +143,70 @@ def can_access(user, tenant):
     if not user.is_authenticated:
         return True
 
-    return tenant.authorized_users.filter(pk=user.pk).exists()
+    return is_authorized(user, tenant)
 
 
 def owns_tenant(user, tenant):
-    return (
-        tenant.schema_name != get_public_schema_name()
-        and tenant.authorized_users.filter(pk=user.pk).exists()
+    return tenant.schema_name != get_public_schema_name() and is_authorized(
+        user, tenant
+    )
+
+
+def _memoize_on_request(request, check):
+    """
+    Perform ``check(request.user, request.tenant)`` at most once per request.
+    The admin calls several permission methods for the same page!
+    """
+    # pylint: disable=protected-access
+    if not hasattr(request, "_tenants_authorization"):
+        request._tenants_authorization = {}
+
+    key = (check.__name__, request.user.pk, request.tenant.pk)
+    if key not in request._tenants_authorization:
+        request._tenants_authorization[key] = check(request.user, request.tenant)
+
+    return request._tenants_authorization[key]
+
+
+def request_can_access(request):
+    return _memoize_on_request(request, can_access)
+
+
+def request_owns_tenant(request):
+    return _memoize_on_request(request, owns_tenant)
+
+
+def authorization_cache_key(tenant_pk, user_pk):
+    return f"tcms_tenants.authorized.{tenant_pk}.{user_pk}"
+
+
+def is_authorized(user, tenant):
+    """
+    Is ``user`` explicitly authorized for ``tenant``? Decisions are kept in
+    the shared cache for ``KIWI_TENANTS_AUTHORIZATION_CACHE_TTL`` seconds and
+    are invalidated by the handlers in ``tcms_tenants.handlers``!
+    """
+    key = authorization_cache_key(tenant.pk, user.pk)
+    authorized = cache.get(key)
+
+    if authorized is None:
+        authorized = tenant.authorized_users.filter(pk=user.pk).exists()
+        cache.set(
+            key,
+            authorized,
+            getattr(settings, "KIWI_TENANTS_AUTHORIZATION_CACHE_TTL", 300),
+        )
+
+    return authorized
+
+
+def invalidate_authorization(tenant_pks, user_pks):
+    cache.delete_many(
+        [
+            authorization_cache_key(tenant_pk, user_pk)
+            for tenant_pk in tenant_pks
+            for user_pk in user_pks
+        ]
     )
 
 
@@ -66,17 +216,48 @@ def schema_name_not_used(name):
 
 
 # warning: doesn't play well when the domain has a port number
-def tenant_domain(schema_name):
-    # take into account the fact that some customers deploy their 'public' schema
-    # without a prefix, e.g. tcms.example.com == KIWI_TENANTS_DOMAIN or could use a
-    # different domain for their tenant(s)!
-    domain = Domain.objects.filter(
-        tenant__schema_name=schema_name, is_primary=True
-    ).first()
-    if domain:
-        return domain.domain
+def tenant_domains(schema_names):
+    """
+    Resolve primary domains for many tenants with a single query.
+    Results are memoized in ``domain_cache``!
+
+    :return: dict of schema_name -> domain
+    """
+    result = {}
+    missing = set()
+
+    for schema_name in schema_names:
+        domain = domain_cache.get(schema_name)
+        if domain is None:
+            missing.add(schema_name)
+        else:
+            result[schema_name] = domain
+
+    if missing:
+        found = {}
+        for schema_name, domain in (
+            Domain.objects.filter(tenant__schema_name__in=missing, is_primary=True)
+            .order_by("pk")
+            .values_list("tenant__schema_name", "domain")
+        ):
+            found.setdefault(schema_name, domain)
+
+        for schema_name in missing:
+            result[schema_name] = found.get(schema_name, TenantCache.NOT_FOUND)
+            domain_cache.set(schema_name, result[schema_name])
+
+    for schema_name, domain in result.items():
+        # take into account the fact that some customers deploy their 'public' schema
+        # without a prefix, e.g. tcms.example.com == KIWI_TENANTS_DOMAIN or could use a
+        # different domain for their tenant(s)!
+        if domain is TenantCache.NOT_FOUND:
+            result[schema_name] = f"{schema_name}.{settings.KIWI_TENANTS_DOMAIN}"
 
-    return f"{schema_name}.{settings.KIWI_TENANTS_DOMAIN}"
+    return result
+
+
+def tenant_domain(schema_name):
+    return tenant_domains([schema_name])[schema_name]
 
 
 def tenant_url(request, schema_name):
@@ -88,11 +269,143 @@ def tenant_url(request, schema_name):
     return url
 
 
+def template_version(schema_name="empty"):
+    """
+    The last migration applied to a schema. Used to detect pooled schemas
+    which have been cloned before the template was migrated!
+    """
+    connection = connections[get_tenant_database_alias()]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT MAX(id) FROM {connection.ops.quote_name(schema_name)}.django_migrations"
+        )
+        return cursor.fetchone()[0]
+
+
+def estimated_count(model):
+    """
+    Number of rows in a public table according to the planner statistics.
+    Cheap but only as accurate as the last ANALYZE, -1 if never analyzed!
+    """
+    connection = connections[get_tenant_database_alias()]
+    table_name = (
+        connection.ops.quote_name(get_public_schema_name())
+        + "."
+        + connection.ops.quote_name(model._meta.db_table)
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [table_name],
+        )
+        return cursor.fetchone()[0]
+
+
+def remove_user_from_schemas(user_pk, schema_names):
+    """
+    Remove a user from all tenant groups and from permissions assigned on
+    each tenant via schema-qualified DELETE statements in a single transaction!
+
+    :return: schema name -> number of removed rows
+    :rtype: dict
+    """
+    connection = connections[get_tenant_database_alias()]
+    quote_name = connection.ops.quote_name
+
+    # pylint: disable=protected-access
+    groups_through = TenantGroup.user_set.through._meta
+    permissions_through = UserModel.user_permissions.through._meta
+    removed = {}
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for schema_name in schema_names:
+            schema = quote_name(schema_name)
+            cursor.execute(
+                f"""WITH groups AS (
+                    DELETE FROM {schema}.{quote_name(groups_through.db_table)}
+                    WHERE {quote_name(groups_through.get_field("user").column)} = %s
+                    RETURNING 1
+                ), permissions AS (
+                    DELETE FROM {schema}.{quote_name(permissions_through.db_table)}
+                    WHERE {quote_name(permissions_through.get_field("user").column)} = %s
+                    RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM groups) + (SELECT COUNT(*) FROM permissions)""",
+                [user_pk, user_pk],
+            )
+            removed[schema_name] = cursor.fetchone()[0]
+
+    for schema_name in schema_names:
+        bump_permissions_version(schema_name)
+
+    return removed
+
+
+def claim_pooled_schema(schema_name):
+    """
+    Rename an unassigned schema from the pool to ``schema_name``.
+
+    :return: True if a schema was claimed, False if the pool is empty
+    """
+    connection = connections[get_tenant_database_alias()]
+
+    with transaction.atomic(using=connection.alias):
+        pooled = (
+            PooledSchema.objects.select_for_update(skip_locked=True)
+            .filter(template_version=template_version())
+            .order_by("created_on")
+            .first()
+        )
+        if not pooled:
+            return False
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER SCHEMA {connection.ops.quote_name(pooled.schema_name)} "
+                f"RENAME TO {connection.ops.quote_name(schema_name)}"
+            )
+        pooled.delete()
+
+    return True
+
+
+def create_tenant_from_pool(form):
+    """
+    :return: A new tenant backed by a pooled schema or None if the pool is empty
+    """
+    if not PooledSchema.objects.exists():
+        return None
+
+    with transaction.atomic():
+        if not claim_pooled_schema(form.cleaned_data["schema_name"]):
+            return None
+
+        tenant = form.save(commit=False)
+        # schema already exists, it was renamed above
+        tenant.auto_create_schema = False
+        tenant.save()
+
+        Domain.objects.create(
+            domain=tenant_domain(tenant.schema_name),
+            is_primary=True,
+            tenant=tenant,
+        )
+
+    return tenant
+
+
 def create_tenant(form, request):
     with schema_context("public"):
+        # If there is an already cloned schema in the pool then use it b/c
+        # renaming takes milliseconds
+        tenant = create_tenant_from_pool(form)
+        if tenant:
+            domain = tenant.domains.first()
         # If a schema with name "empty" exists then use it for
         # cloning b/c that's faster
-        if Tenant.objects.filter(schema_name="empty").first():
+        elif Tenant.objects.filter(schema_name="empty").first():
             schema_name = form.cleaned_data["schema_name"]
             paid_until = form.cleaned_data["paid_until"] or datetime.datetime(
                 3000, 3, 31
@@ -163,7 +476,7 @@ def create_tenant(form, request):
         TenantGroup.objects.get(name="Administrator").user_set.add(tenant.owner)
         TenantGroup.objects.get(name="Tester").user_set.add(tenant.owner)
 
-    mailto(
+    send_emails(
         template_name="tcms_tenants/email/new.txt",
         recipients=[tenant.owner.email],
         subject=str(_("New Kiwi TCMS tenant created")),
@@ -174,6 +487,38 @@ def create_tenant(form, request):
     return tenant
 
 
+def send_emails(template_name, recipients, subject, context):
+    """
+    Send the same message to each recipient individually. When
+    ``KIWI_TENANTS_EMAIL_OUTBOX`` is set messages are stored in the database
+    and delivered later by the ``send_tenant_emails`` command!
+    """
+    if not getattr(settings, "KIWI_TENANTS_EMAIL_OUTBOX", False):
+        for recipient in recipients:
+            mailto(
+                template_name=template_name,
+                recipients=[recipient],
+                subject=subject,
+                context=context,
+            )
+        return
+
+    with override(settings.LANGUAGE_CODE):
+        body = render_to_string(template_name, context)
+
+    with schema_context(get_public_schema_name()):
+        OutboxEmail.objects.bulk_create(
+            [
+                OutboxEmail(
+                    subject=settings.EMAIL_SUBJECT_PREFIX + subject,
+                    body=body,
+                    recipients=[recipient],
+                )
+                for recipient in recipients
+            ]
+        )
+
+
 # NOTE: defined here to avoid circular imports with forms.py
 class RegistrationForm(
     kiwi_auth_forms.RegistrationForm
@@ -214,6 +559,107 @@ def create_user_account(email_address):
     return user
 
 
+def random_password_hashes(count):
+    """
+    Hashes of random passwords which nobody knows, users are expected to reset
+    them. Key stretching doesn't make 128 bit random secrets any stronger so use
+    a single iteration when the default hasher allows it, otherwise hashing
+    thousands of passwords is intentionally slow!
+    """
+    hasher = get_hasher()
+
+    if isinstance(hasher, PBKDF2PasswordHasher):
+        return [
+            hasher.encode(uuid.uuid4().hex, hasher.salt(), iterations=1)
+            for _ in range(count)
+        ]
+
+    return [make_password(uuid.uuid4().hex) for _ in range(count)]
+
+
+def create_user_accounts(email_addresses):
+    """
+    Bulk version of ``create_user_account()``. Addresses which don't pass
+    validation are handled one by one via the registration form which will
+    raise in the same way!
+    """
+    validate_username = UnicodeUsernameValidator()
+    desired_usernames = {}
+    one_by_one = []
+
+    for email_address in email_addresses:
+        username = email_address.split("@")[0]
+        try:
+            custom_email_validators(email_address)
+            validate_username(username)
+            desired_usernames[email_address] = username
+        except ValidationError:
+            one_by_one.append(email_address)
+
+    # existing usernames which are one of the desired ones, case-insensitive.
+    # Uses the index from migration 0014_auth_user_lower_username_index
+    bases = {username.lower() for username in desired_usernames.values()}
+    taken = set()
+    if bases:
+        taken = set(
+            UserModel.objects.annotate(lower_username=Lower("username"))
+            .filter(lower_username__in=bases)
+            .values_list("lower_username", flat=True)
+        )
+
+    # rarely, when some of them are taken, look for the ones with a numeric
+    # suffix too, see create_user_account(). This can't use an index!
+    collisions = bases & taken
+    if collisions:
+        taken.update(
+            UserModel.objects.annotate(
+                lower_username=Lower("username"),
+                base_username=Func(
+                    Lower("username"),
+                    Value(r"\.[0-9]+$"),
+                    Value(""),
+                    function="regexp_replace",
+                ),
+            )
+            .filter(base_username__in=collisions)
+            .values_list("lower_username", flat=True)
+        )
+
+    passwords = random_password_hashes(len(desired_usernames))
+
+    new_users = []
+    for email_address, desired_username in desired_usernames.items():
+        username = desired_username
+        i = 1
+        while username.lower() in taken:
+            username = f"{desired_username}.{i}"
+            i += 1
+        taken.add(username.lower())
+
+        new_users.append(
+            UserModel(
+                username=username,
+                email=email_address,
+                password=passwords.pop(),
+                is_active=True,
+                is_staff=True,
+            )
+        )
+
+    users = UserModel.objects.bulk_create(new_users)
+
+    # the same as initiate_user_with_default_setups() called by the registration form
+    if users:
+        assign_default_group_permissions()
+        for group in Group.objects.filter(name__in=settings.DEFAULT_GROUPS):
+            group.user_set.add(*users)
+
+    for email_address in one_by_one:
+        users.append(create_user_account(email_address))
+
+    return users
+
+
 def add_to_default_groups(user, request=None):
     """
     If there are tenant groups whose names match the default setting the user
@@ -230,7 +676,23 @@ def add_to_default_groups(user, request=None):
             )
 
 
+def add_many_to_default_groups(users):
+    """
+    Same as ``add_to_default_groups()`` but with a single query per group!
+    """
+    for group in TenantGroup.objects.filter(name__in=settings.DEFAULT_GROUPS):
+        group.user_set.add(*users)
+
+
 def invite_users(request, email_addresses, notify_via_email=True):
+    """
+    Authorize users for the current tenant, creating accounts for unknown
+    email addresses. The number of queries doesn't depend on the number
+    of addresses!
+
+    :return: email address -> "invited", "created-account" or "already-authorized"
+    :rtype: dict
+    """
     the_tenant_url = tenant_url(request, request.tenant.schema_name).strip("/")
     pwd_reset_path = reverse_lazy("tcms-password_reset").rstrip("/")
     email_context = {
@@ -239,28 +701,135 @@ def invite_users(request, email_addresses, notify_via_email=True):
         "password_reset_url": f"{the_tenant_url}/{pwd_reset_path}",
     }
 
-    for email in email_addresses:
-        email = email.lower()
+    email_addresses = list(dict.fromkeys(email.lower() for email in email_addresses))
+    result = {}
+    invited = []
 
+    with transaction.atomic():
         # note: users are on public_schema
-        user = UserModel.objects.filter(email=email).first()
+        users = {}
+        for user in UserModel.objects.filter(email__in=email_addresses).order_by("pk"):
+            users.setdefault(user.email, user)
 
         # email not found, need to create account for them
-        if not user:
-            user = create_user_account(email)
+        for user in create_user_accounts(
+            [email for email in email_addresses if email not in users]
+        ):
+            users[user.email] = user
+            result[user.email] = "created-account"
+
+        already_authorized = set(
+            request.tenant.authorized_users.filter(
+                pk__in=[user.pk for user in users.values()]
+            ).values_list("pk", flat=True)
+        )
+
+        for email in email_addresses:
+            user = users[email]
+            if user.pk in already_authorized:
+                result[email] = "already-authorized"
+            else:
+                result.setdefault(email, "invited")
+                invited.append(user)
+
+        if invited:
+            request.tenant.authorized_users.add(*invited)
+            with tenant_context(request.tenant):
+                add_many_to_default_groups(invited)
+
+    if notify_via_email and invited:
+        send_emails(
+            template_name="tcms_tenants/email/invite_user.txt",
+            recipients=[user.email for user in invited],
+            subject=str(_("Invitation to join Kiwi TCMS")),
+            context=email_context,
+        )
+
+    return result
+
+
+def validate_email_addresses(email_addresses):
+    """
+    Validate all addresses in a single pass, the same way as ``InviteUsersForm``!
 
-        # user already authorized for tenant
-        if request.tenant.authorized_users.filter(pk=user.pk).exists():
-            continue
+    :return: (address -> cleaned address, address -> reason)
+    :rtype: tuple(dict, dict)
+    """
+    field = forms.EmailField(validators=[custom_email_validators])
+    valid = {}
+    errored = {}
 
-        request.tenant.authorized_users.add(user)
-        with tenant_context(request.tenant):
-            add_to_default_groups(user)
+    for email in email_addresses:
+        try:
+            valid[email] = field.clean(email)
+        except ValidationError as err:
+            errored[email] = " ".join(err.messages)
 
-        if notify_via_email:
-            mailto(
-                template_name="tcms_tenants/email/invite_user.txt",
-                recipients=[user.email],
-                subject=str(_("Invitation to join Kiwi TCMS")),
-                context=email_context,
-            )
+    return valid, errored
+
+
+def iter_email_addresses(uploaded_file):
+    """
+    Stream email addresses from an uploaded CSV or JSON Lines file without
+    reading all of it into memory. CSV files may have a header row with an
+    ``email`` column, otherwise the first column is used. JSON Lines may contain
+    either strings or objects with an ``email`` key!
+    """
+    lines = codecs.iterdecode(uploaded_file, "utf-8-sig")
+
+    if uploaded_file.name.lower().endswith((".jsonl", ".ndjson")):
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # reported as an invalid address
+                yield line
+                continue
+
+            if isinstance(record, dict):
+                record = record.get("email", "")
+            yield str(record).strip()
+        return
+
+    rows = csv.reader(lines)
+    column = 0
+    for row in rows:
+        header = [cell.strip().lower() for cell in row]
+        if "email" in header:
+            column = header.index("email")
+        elif row:
+            yield row[column].strip() if len(row) > column else ""
+        break
+
+    for row in rows:
+        if any(cell.strip() for cell in row):
+            yield row[column].strip() if len(row) > column else ""
+
+
+def import_authorized_users(request, email_addresses, notify_via_email=True):
+    """
+    Authorize a stream of email addresses for the current tenant in batches of
+    ``KIWI_TENANTS_IMPORT_BATCH_SIZE`` via ``invite_users()``!
+
+    :return: (address, status, reason) for each address in input order
+    :rtype: list
+    """
+    batch_size = getattr(settings, "KIWI_TENANTS_IMPORT_BATCH_SIZE", 1000)
+    email_addresses = iter(email_addresses)
+    report = []
+
+    while batch := list(itertools.islice(email_addresses, batch_size)):
+        valid, errored = validate_email_addresses(batch)
+        statuses = invite_users(request, valid.values(), notify_via_email)
+
+        for email in batch:
+            if email in errored:
+                report.append((email, "invalid", errored[email]))
+            else:
+                report.append((email, statuses[valid[email].lower()], ""))
+
+    return report
@@ -1,19 +1,36 @@
-# Copyright (c) 2019-2024 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2019-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
 
+import mimetypes
+import os
+from urllib.parse import quote
+
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import permission_required
-from django.http import HttpResponseRedirect
-from django.views.generic.base import RedirectView
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    HttpResponseRedirect,
+)
+from django.views.generic.base import RedirectView, View
+from django.views.generic.detail import DetailView
 from django.views.generic.edit import FormView, UpdateView
 from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.utils.translation import gettext_lazy as _
 
+from django_tenants.utils import get_public_schema_name, schema_context
+
 from tcms_tenants import utils
 from tcms_tenants.forms import (
     InviteUsersForm,
@@ -21,7 +38,7 @@ from tcms_tenants.forms import (
     UpdateTenantForm,
     VALIDATION_RE,
 )
-from tcms_tenants.models import Tenant
+from tcms_tenants.models import ProvisioningJob, Tenant
 
 
 @method_decorator(permission_required("tcms_tenants.add_tenant"), name="dispatch")
@@ -53,12 +70,74 @@ class NewTenantView(FormView):
         kwargs["initial"]["owner"] = self.request.user.pk
         return kwargs
 
+    def schema_name_reserved(self, form):
+        form.add_error("schema_name", _("Schema name already in use"))
+        return self.form_invalid(form)
+
     def form_valid(self, form):
+        schema_name = form.cleaned_data["schema_name"]
+        with schema_context("public"):
+            if ProvisioningJob.objects.filter(
+                schema_name=schema_name, status__in=ProvisioningJob.ACTIVE
+            ).exists():
+                return self.schema_name_reserved(form)
+
+        if getattr(settings, "KIWI_TENANTS_ASYNC_CREATE", False):
+            # will be created by the process_tenant_jobs command
+            data = {name: form.data.get(name) for name in form.fields}
+            data["owner"] = self.request.user.pk
+
+            try:
+                with schema_context("public"), transaction.atomic():
+                    job = ProvisioningJob.objects.create(
+                        schema_name=schema_name,
+                        data=data,
+                        owner=self.request.user,
+                    )
+            except IntegrityError:
+                # another job for the same schema was submitted in the meantime
+                return self.schema_name_reserved(form)
+
+            return HttpResponseRedirect(
+                reverse("tcms_tenants:create-status", args=[job.pk])
+            )
+
         tenant = utils.create_tenant(form, self.request)
         # all is successfull so redirect to the new tenant
         return HttpResponseRedirect(utils.tenant_url(self.request, tenant.schema_name))
 
 
+@method_decorator(login_required, name="dispatch")
+class ProvisioningStatusView(DetailView):  # pylint: disable=missing-permission-required
+    """
+    Shows the progress of a tenant created in asynchronous mode and
+    redirects to the new tenant once it is ready!
+    """
+
+    template_name = "tcms_tenants/provisioning_status.html"
+
+    def get_queryset(self):
+        return ProvisioningJob.objects.filter(owner=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        with schema_context("public"):
+            # pylint: disable-next=attribute-defined-outside-init
+            self.object = self.get_object()
+
+        # the tenant may have been deleted after it was created
+        if self.object.status == ProvisioningJob.DONE and self.object.tenant:
+            return HttpResponseRedirect(
+                utils.tenant_url(request, self.object.tenant.schema_name)
+            )
+
+        context = self.get_context_data(object=self.object)
+        context["refresh"] = self.object.status in (
+            ProvisioningJob.PENDING,
+            ProvisioningJob.RUNNING,
+        )
+        return self.render_to_response(context)
+
+
 @method_decorator(permission_required("tcms_tenants.change_tenant"), name="dispatch")
 class UpdateTenantView(UpdateView):
     model = Tenant
@@ -146,7 +225,7 @@ class InviteUsers(FormView):  # pylint: disable=missing-permission-required
     template_name = "tcms_tenants/invite_users.html"
 
     def get(self, request, *args, **kwargs):
-        if not utils.owns_tenant(request.user, request.tenant):
+        if not utils.request_owns_tenant(request):
             messages.add_message(
                 request,
                 messages.ERROR,
@@ -160,3 +239,63 @@ class InviteUsers(FormView):  # pylint: disable=missing-permission-required
         utils.invite_users(self.request, form.cleaned_data["emails"])
 
         return HttpResponseRedirect("/")
+
+
+class ServeMedia(View):  # pylint: disable=missing-permission-required
+    """
+    Serve uploaded files for the current tenant after checking that the
+    user is allowed to access it. The actual transfer is handed over to the
+    front-end web server when ``KIWI_TENANTS_MEDIA_SENDFILE`` is set to either
+    ``X-Accel-Redirect`` (nginx) or ``X-Sendfile`` (Apache, lighttpd)!
+    """
+
+    http_method_names = ["get", "head"]
+
+    def get(self, request, *args, **kwargs):
+        tenant = request.tenant
+        if (
+            not request.user.is_authenticated
+            and not tenant.publicly_readable
+            and tenant.schema_name != get_public_schema_name()
+        ):
+            return redirect_to_login(request.get_full_path())
+
+        if not utils.request_can_access(request):
+            return HttpResponseForbidden(_("Unauthorized"))
+
+        try:
+            # NOTE: .path() is tenant/schema aware and prevents directory traversal
+            full_path = default_storage.path(kwargs["path"])
+        except SuspiciousFileOperation as err:
+            raise Http404() from err
+
+        if not os.path.isfile(full_path):
+            raise Http404()
+
+        sendfile = getattr(settings, "KIWI_TENANTS_MEDIA_SENDFILE", None)
+        if not sendfile:
+            # closed by FileResponse once the response has been sent
+            fileobj = open(full_path, "rb")  # pylint: disable=consider-using-with
+            return FileResponse(fileobj)
+
+        content_type, encoding = mimetypes.guess_type(full_path)
+        response = HttpResponse(content_type=content_type or "application/octet-stream")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+
+        if sendfile.lower() == "x-accel-redirect":
+            # an internal location in nginx which is an alias for MEDIA_ROOT
+            prefix = getattr(
+                settings, "KIWI_TENANTS_MEDIA_ACCEL_PREFIX", "/private-media/"
+            )
+            relative_path = os.path.relpath(
+                full_path, os.path.abspath(default_storage.base_location)
+            )
+            response.headers["X-Accel-Redirect"] = quote(
+                prefix.rstrip("/") + "/" + relative_path
+            )
+        else:
+            # header values must be latin-1, mod_xsendfile URL-decodes them
+            response.headers["X-Sendfile"] = quote(full_path)
+
+        return response
@@ -1,4 +1,4 @@
-# Copyright (c) 2022 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2022-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
@@ -13,6 +13,19 @@ class AppConfig(DjangoAppConfig):
     name = "tenant_groups"
 
     def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import m2m_changed, post_delete
         from tenant_groups import checks
 
+        from .handlers import permissions_changed
+        from .models import Group
+
         register(checks.tenant_groups_backend)
+
+        for through in (
+            Group.permissions.through,
+            Group.user_set.through,
+            get_user_model().user_permissions.through,
+        ):
+            m2m_changed.connect(permissions_changed, sender=through)
+        post_delete.connect(permissions_changed, sender=Group)
@@ -1,13 +1,16 @@
-# Copyright (c) 2022 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2022-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
 
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth.models import Permission
+from django.core.cache import cache
 
 from django_tenants.utils import get_public_schema_name, tenant_context
 from tcms_tenants.utils import get_current_tenant
+from tenant_groups.utils import permissions_cache_key
 
 
 class GroupsBackend(ModelBackend):
@@ -17,6 +20,10 @@ class GroupsBackend(ModelBackend):
 
     NOTE: Individually assigned permissions have higher priority
     (are valid across tenants) compared to group permissions.
+
+    NOTE: Permissions on tenants are cached across requests for
+    ``KIWI_TENANTS_PERMISSIONS_CACHE_TTL`` seconds. The cache is invalidated
+    by the handlers in ``tenant_groups.handlers``!
     """
 
     public_schema_name = get_public_schema_name()
@@ -25,19 +32,54 @@ class GroupsBackend(ModelBackend):
     def tenant(self):
         return get_current_tenant()
 
+    def _cached_permissions(self, tenant, user_obj, kind):
+        # individual user permissions live in the public schema and are the
+        # same on every tenant so they are cached & invalidated only once
+        schema_name = self.public_schema_name if kind == "user" else tenant.schema_name
+        key = permissions_cache_key(schema_name, user_obj.pk, kind)
+        permissions = cache.get(key)
+
+        if permissions is None:
+            with tenant_context(tenant):
+                if kind == "user":
+                    permissions = super().get_user_permissions(user_obj)
+                else:
+                    permissions = (
+                        Permission.objects.filter(
+                            tenant_groups__user_set__in=[user_obj]
+                        )
+                        .values_list("content_type__app_label", "codename")
+                        .order_by()
+                    )
+                    permissions = {f"{ct}.{name}" for ct, name in permissions}
+
+            cache.set(
+                key,
+                permissions,
+                getattr(settings, "KIWI_TENANTS_PERMISSIONS_CACHE_TTL", 300),
+            )
+
+        return permissions
+
+    def get_user_permissions(self, user_obj, obj=None):
+        tenant = self.tenant
+        if (
+            tenant.schema_name == self.public_schema_name
+            or not user_obj.is_active
+            or user_obj.is_anonymous
+            or obj is not None
+        ):
+            return super().get_user_permissions(user_obj, obj)
+
+        return self._cached_permissions(tenant, user_obj, "user")
+
     def get_group_permissions(self, user_obj, obj=None):
         # group permissions configured on public tenant via
         # django.contrib.auth.models.Group
-        if self.tenant.schema_name == self.public_schema_name:
+        tenant = self.tenant
+        if tenant.schema_name == self.public_schema_name:
             return super().get_group_permissions(user_obj, obj)
 
         # permissions configured per-tenant via
         # tenant_groups.models.Group
-        with tenant_context(self.tenant):
-            permissions = (
-                Permission.objects.filter(tenant_groups__user_set__in=[user_obj])
-                .values_list("content_type__app_label", "codename")
-                .order_by()
-            )
-
-            return {f"{ct}.{name}" for ct, name in permissions}
+        return self._cached_permissions(tenant, user_obj, "group")
@@ -0,0 +1,37 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from django_tenants.utils import get_public_schema_name
+
+from tenant_groups.utils import bump_permissions_version
+
+
+def permissions_changed(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Invalidate cached permissions on the current tenant when
+    group permissions or group membership are modified and on all tenants
+    when individual user permissions are modified!
+
+    .. warning::
+
+        This handler is connected to ``m2m_changed`` for
+        ``Group.permissions``, ``Group.user_set`` and ``User.user_permissions``
+        and to ``post_delete`` for ``Group`` by default!
+    """
+    if kwargs.get("raw", False):
+        return
+
+    action = kwargs.get("action")
+    if action and not action.startswith("post_"):
+        return
+
+    # valid on all tenants, see GroupsBackend._cached_permissions()
+    if sender is get_user_model().user_permissions.through:
+        bump_permissions_version(get_public_schema_name())
+    else:
+        bump_permissions_version(connection.schema_name)
@@ -1,8 +1,15 @@
-# Copyright (c) 2022 Alexander Todorov <atodorov@otb.bg>
+# Copyright (c) 2022-2026 Alexander Todorov <atodorov@otb.bg>
 #
 # Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
 # https://www.gnu.org/licenses/agpl-3.0.html
 
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import StringIO
+
+import django
+from django.db import connections
+
 from django_tenants.utils import (
     get_public_schema_name,
     get_tenant_model,
@@ -11,6 +18,47 @@ from django_tenants.utils import (
 from tcms.core.management.commands import refresh_permissions
 
 from tenant_groups.models import Group as TenantGroup
+from tenant_groups.utils import bump_permissions_version, permissions_fingerprint
+
+
+def refresh_tenant(schema_name, options, reference_fingerprint=None):
+    """
+    Refresh permissions for a single tenant. Runs inside worker processes
+    so it needs to be a module level function!
+
+    :return: (schema_name, refreshed or skipped, seconds, output, fingerprint)
+    :rtype: tuple
+    """
+    started = time.monotonic()
+    output = StringIO()
+    tenant = get_tenant_model().objects.get(schema_name=schema_name)
+
+    with tenant_context(tenant):
+        fingerprint = permissions_fingerprint()
+        if reference_fingerprint and fingerprint == reference_fingerprint:
+            return schema_name, "skipped", time.monotonic() - started, "", fingerprint
+
+        command = Command(stdout=output)
+        if options["verbosity"]:
+            output.write(
+                f"\n\n === Refreshing permissions for tenant '{schema_name}' ==="
+            )
+
+        command.execute_commands(**options)
+        fingerprint = permissions_fingerprint()
+
+        if options["verbosity"]:
+            output.write(
+                f"\n\n === End refreshing permissions for tenant '{schema_name}' ==="
+            )
+
+    return (
+        schema_name,
+        "refreshed",
+        time.monotonic() - started,
+        output.getvalue(),
+        fingerprint,
+    )
 
 
 class Command(refresh_permissions.Command):
@@ -24,23 +72,92 @@ class Command(refresh_permissions.Command):
         "content_type__app_label__in": TenantGroup.relevant_apps,
     }
 
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--workers",
+            action="store",
+            dest="workers",
+            type=int,
+            default=1,
+            help="Number of worker processes, each one with its own DB connection",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            dest="incremental",
+            default=False,
+            help="Skip tenants whose 'Administrator' & 'Tester' permissions already "
+            "match the ones of the first refreshed tenant",
+        )
+
     def handle(self, *args, **kwargs):
-        for tenant in get_tenant_model().objects.exclude(
-            schema_name=get_public_schema_name(),
-        ):
-            output = None
-            if kwargs["verbosity"]:
-                output = self.stdout
-
-            with tenant_context(tenant):
-                if output:
-                    output.write(
-                        f"\n\n === Refreshing permissions for tenant '{tenant.schema_name}' ==="
-                    )
+        self.verbosity = kwargs["verbosity"]
+        started = time.monotonic()
+        # everything except output streams which can't be sent to child processes
+        options = {
+            key: value
+            for key, value in kwargs.items()
+            if key not in ("stdout", "stderr")
+        }
+        schema_names = list(
+            get_tenant_model()
+            .objects.exclude(schema_name=get_public_schema_name())
+            .order_by("pk")
+            .values_list("schema_name", flat=True)
+        )
+        results = []
+
+        # the first tenant is always refreshed and becomes the reference
+        # for what permissions on all other tenants should look like
+        reference_fingerprint = None
+        if kwargs["incremental"] and schema_names:
+            results.append(self.report(refresh_tenant(schema_names.pop(0), options)))
+            reference_fingerprint = results[0][4]
 
-                self.execute_commands(*args, **kwargs)
+        if kwargs["workers"] > 1:
+            # don't share the parent's DB connection with child processes
+            connections.close_all()
 
-                if output:
-                    output.write(
-                        f"\n\n === End refreshing permissions for tenant '{tenant.schema_name}' ==="
+            with ProcessPoolExecutor(
+                max_workers=kwargs["workers"], initializer=django.setup
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        refresh_tenant, schema_name, options, reference_fingerprint
                     )
+                    for schema_name in schema_names
+                ]
+                for future in as_completed(futures):
+                    results.append(self.report(future.result()))
+        else:
+            for schema_name in schema_names:
+                results.append(
+                    self.report(
+                        refresh_tenant(schema_name, options, reference_fingerprint)
+                    )
+                )
+
+        if kwargs["verbosity"]:
+            refreshed = len([result for result in results if result[1] == "refreshed"])
+            self.stdout.write(
+                f"\nRefreshed {refreshed} and skipped {len(results) - refreshed} "
+                f"tenants in {time.monotonic() - started:.2f}s"
+            )
+
+    def report(self, result):
+        """
+        Called from this process as soon as each tenant is done!
+        """
+        schema_name, status, seconds, output, _fingerprint = result
+
+        # here b/c workers may not share the same cache
+        if status == "refreshed":
+            bump_permissions_version(schema_name)
+
+        if output:
+            self.stdout.write(output)
+        if self.verbosity:
+            self.stdout.write(f"Tenant '{schema_name}': {status} in {seconds:.2f}s")
+
+        return result
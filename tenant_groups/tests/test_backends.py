@@ -0,0 +1,85 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+# pylint: disable=too-many-ancestors
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+
+from django_tenants.utils import schema_context, tenant_context
+from tcms_tenants.tests import TenantGroupsTestCase, UserFactory
+from tenant_groups.backends import GroupsBackend
+from tenant_groups.models import Group as TenantGroup
+
+UserModel = get_user_model()
+
+
+class GroupsBackendCacheTestCase(TenantGroupsTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.backend = GroupsBackend()
+        cls.user = UserFactory()
+        cls.permission = Permission.objects.get(
+            content_type__app_label="testplans", codename="add_testplan"
+        )
+
+        with tenant_context(cls.tenant):
+            cls.group = TenantGroup.objects.create(name="Cached permissions")
+            cls.group.user_set.add(cls.user)
+
+    def get_permissions(self):
+        # fresh object b/c ModelBackend caches permissions on the instance
+        user = UserModel.objects.get(pk=self.user.pk)
+        return self.backend.get_all_permissions(user)
+
+    def test_returning_user_does_not_query_the_database(self):
+        with tenant_context(self.tenant):
+            permissions = self.get_permissions()
+            user = UserModel.objects.get(pk=self.user.pk)
+
+            with self.assertNumQueries(0):
+                self.assertEqual(self.backend.get_all_permissions(user), permissions)
+
+    def test_cache_is_invalidated_when_group_permissions_change(self):
+        with tenant_context(self.tenant):
+            self.assertNotIn("testplans.add_testplan", self.get_permissions())
+
+            self.group.permissions.add(self.permission)
+            self.assertIn("testplans.add_testplan", self.get_permissions())
+
+            self.group.permissions.remove(self.permission)
+            self.assertNotIn("testplans.add_testplan", self.get_permissions())
+
+    def test_cache_is_invalidated_when_group_membership_changes(self):
+        with tenant_context(self.tenant):
+            self.group.permissions.add(self.permission)
+            self.assertIn("testplans.add_testplan", self.get_permissions())
+
+            self.group.user_set.remove(self.user)
+            self.assertNotIn("testplans.add_testplan", self.get_permissions())
+
+    def test_user_permissions_changed_on_public_are_seen_by_tenants(self):
+        with tenant_context(self.tenant):
+            self.assertNotIn("testplans.add_testplan", self.get_permissions())
+
+        with schema_context("public"):
+            self.user.user_permissions.add(self.permission)
+
+        with tenant_context(self.tenant):
+            self.assertIn("testplans.add_testplan", self.get_permissions())
+
+        with schema_context("public"):
+            self.permission.user_set.remove(self.user)
+
+        with tenant_context(self.tenant):
+            self.assertNotIn("testplans.add_testplan", self.get_permissions())
+
+    def test_cache_is_invalidated_when_user_permissions_change(self):
+        with tenant_context(self.tenant):
+            self.assertNotIn("testplans.add_testplan", self.get_permissions())
+
+            self.user.user_permissions.add(self.permission)
+            self.assertIn("testplans.add_testplan", self.get_permissions())
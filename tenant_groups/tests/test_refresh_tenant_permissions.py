@@ -0,0 +1,122 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+# pylint: disable=too-many-ancestors
+from concurrent.futures import Future
+from io import StringIO
+from mock import patch
+
+from django.contrib.auth.models import Permission
+from django.core.management import call_command
+
+from django_tenants.utils import tenant_context
+from tcms_tenants.tests import TenantGroupsTestCase
+from tenant_groups.management.commands.refresh_tenant_permissions import (
+    refresh_tenant,
+)
+from tenant_groups.models import Group as TenantGroup
+
+OPTIONS = {"verbosity": 0, "interactive": False}
+COMMAND = "tenant_groups.management.commands.refresh_tenant_permissions"
+
+
+class InProcessExecutor:
+    """
+    Runs everything immediately b/c worker processes wouldn't see
+    the test data which isn't committed!
+    """
+
+    def __init__(self, max_workers, initializer):
+        self.max_workers = max_workers
+        self.initializer = initializer
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    @staticmethod
+    def submit(func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+
+class RefreshTenantPermissionsTestCase(TenantGroupsTestCase):
+    def test_prints_timing_summary(self):
+        output = StringIO()
+        call_command("refresh_tenant_permissions", "--noinput", stdout=output)
+
+        output = output.getvalue()
+        self.assertIn(f"Tenant '{self.tenant.schema_name}': refreshed in", output)
+        self.assertRegex(output, r"Refreshed \d+ and skipped 0 tenants in")
+
+    def test_tenant_matching_reference_fingerprint_is_skipped(self):
+        _schema, status, _seconds, _output, fingerprint = refresh_tenant(
+            self.tenant.schema_name, OPTIONS
+        )
+        self.assertEqual(status, "refreshed")
+
+        _schema, status, _seconds, _output, _fingerprint = refresh_tenant(
+            self.tenant.schema_name, OPTIONS, fingerprint
+        )
+        self.assertEqual(status, "skipped")
+
+    def test_tenant_with_different_permissions_is_refreshed(self):
+        _schema, _status, _seconds, _output, fingerprint = refresh_tenant(
+            self.tenant.schema_name, OPTIONS
+        )
+
+        with tenant_context(self.tenant):
+            TenantGroup.objects.get(name="Tester").permissions.remove(
+                Permission.objects.get(
+                    content_type__app_label="testplans", codename="add_testplan"
+                )
+            )
+
+        _schema, status, _seconds, _output, new_fingerprint = refresh_tenant(
+            self.tenant.schema_name, OPTIONS, fingerprint
+        )
+        self.assertEqual(status, "refreshed")
+        self.assertEqual(new_fingerprint, fingerprint)
+
+    @patch(f"{COMMAND}.bump_permissions_version")
+    def test_permissions_version_is_bumped_once_per_refreshed_tenant(self, bump):
+        call_command(
+            "refresh_tenant_permissions", "--noinput", verbosity=0, stdout=StringIO()
+        )
+
+        bumped = [call.args[0] for call in bump.call_args_list]
+        self.assertIn(self.tenant.schema_name, bumped)
+        self.assertEqual(len(bumped), len(set(bumped)))
+
+    @patch("tcms.core.management.commands.refresh_permissions.Command.execute_commands")
+    def test_all_options_are_forwarded(self, execute_commands):
+        call_command(
+            "refresh_tenant_permissions", "--noinput", verbosity=0, stdout=StringIO()
+        )
+
+        self.assertTrue(execute_commands.called)
+        options = execute_commands.call_args.kwargs
+        self.assertEqual(options["verbosity"], 0)
+        self.assertFalse(options["interactive"])
+        self.assertIn("skip_checks", options)
+        self.assertNotIn("stdout", options)
+
+    @patch(f"{COMMAND}.connections")
+    @patch(f"{COMMAND}.ProcessPoolExecutor", InProcessExecutor)
+    @patch(f"{COMMAND}.bump_permissions_version")
+    def test_parallel_workers_bump_each_tenant_when_done(self, bump, connections):
+        output = StringIO()
+        call_command(
+            "refresh_tenant_permissions", "--noinput", workers=2, stdout=output
+        )
+
+        self.assertTrue(connections.close_all.called)
+        self.assertIn(
+            f"Tenant '{self.tenant.schema_name}': refreshed in", output.getvalue()
+        )
+        bump.assert_any_call(self.tenant.schema_name)
@@ -0,0 +1,64 @@
+# Copyright (c) 2026 Alexander Todorov <atodorov@otb.bg>
+#
+# Licensed under GNU Affero General Public License v3 or later (AGPLv3+)
+# https://www.gnu.org/licenses/agpl-3.0.html
+
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from tenant_groups.models import Group as TenantGroup
+
+
+def _version_key(schema_name):
+    return f"tenant_groups.version.{schema_name}"
+
+
+def get_permissions_version(schema_name):
+    """
+    Return the current version of all permission assignments on a tenant.
+    Initialized with a timestamp so that cached permissions can't be reused
+    if the counter itself has been evicted from the cache!
+    """
+    key = _version_key(schema_name)
+    version = cache.get(key)
+
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_permissions_version(schema_name):
+    """
+    Invalidate all cached permissions on a tenant!
+    """
+    try:
+        cache.incr(_version_key(schema_name))
+    except ValueError:
+        # key doesn't exist, will be initialized on next access
+        pass
+
+
+def permissions_cache_key(schema_name, user_pk, kind):
+    version = get_permissions_version(schema_name)
+    return f"tenant_groups.permissions.{schema_name}.{user_pk}.{kind}.{version}"
+
+
+def permissions_fingerprint():
+    """
+    Hash of the permissions assigned to the 'Administrator' & 'Tester' groups
+    in the current schema!
+    """
+    permissions = (
+        TenantGroup.objects.filter(name__in=["Administrator", "Tester"])
+        .values_list(
+            "name", "permissions__content_type__app_label", "permissions__codename"
+        )
+        .order_by(
+            "name", "permissions__content_type__app_label", "permissions__codename"
+        )
+    )
+    return hashlib.sha256(repr(list(permissions)).encode()).hexdigest()